@@ -0,0 +1,206 @@
+"""Бенчмарк цикла опроса на заглушках.
+
+Цикл get_api_answer -> check_response -> parse_status -> send_message
+прогоняется против заглушек из tests/utils.py (режим stub) или против
+локального HTTP-сервера (режим http) с разным числом работ, пользователей
+и искусственной задержкой ответа API.
+
+    python benchmarks/bench_cycle.py --mode stub http --homeworks 1 100
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BASE_DIR, os.path.join(BASE_DIR, 'tests')]
+for name, value in (('PRACTICUM_TOKEN', 'sometoken'),
+                    ('TELEGRAM_TOKEN', '1234:abcdefg'),
+                    ('TELEGRAM_CHAT_ID', '12345')):
+    os.environ.setdefault(name, value)
+
+import requests  # noqa: E402
+
+import homework  # noqa: E402
+import transport  # noqa: E402
+import utils  # noqa: E402
+
+STATUSES = tuple(homework.HOMEWORK_VERDICTS)
+
+
+def make_payload(homeworks):
+    """Ответ API с заданным числом работ."""
+    return {
+        'homeworks': [
+            {
+                'id': index,
+                'homework_name': f'hw{index}',
+                'status': STATUSES[index % len(STATUSES)],
+                'date_updated': '2020-02-13T14:40:57Z',
+            }
+            for index in range(homeworks)
+        ],
+        'current_date': int(time.time()),
+    }
+
+
+def stub_get(payload, latency):
+    """Замена requests.get на MockResponseGET с готовым ответом."""
+    def mocked_get(*args, **kwargs):
+        if latency:
+            time.sleep(latency)
+        response = utils.MockResponseGET(random_timestamp=0)
+        response.json = lambda: payload
+        return response
+    return mocked_get
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Ответ API из атрибутов сервера: payload и latency."""
+
+    def do_GET(self):
+        """Отдача заранее сериализованного ответа."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, format, *args):
+        """Запросы не логируются."""
+
+
+def start_stub_server(payload, latency):
+    """Локальный HTTP-сервер, отдающий payload."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.body = json.dumps(payload).encode('utf-8')
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_cycle(bot, session):
+    """Один полный цикл опроса и отправки для одного пользователя."""
+    response = homework.fetch_homeworks(
+        homework.HEADERS, {'from_date': 0}, session
+    )
+    homework.check_response(response)
+    for work in response['homeworks']:
+        homework.send_message(bot, homework.parse_status(work))
+
+
+def run_scenario(bot, session, tenants, cycles):
+    """Времена циклов: cycles циклов для каждого из tenants."""
+    def timed_cycle(_):
+        started = time.perf_counter()
+        run_cycle(bot, session)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=tenants) as executor:
+        return list(executor.map(timed_cycle, range(tenants * cycles)))
+
+
+def percentile(values, fraction):
+    """Перцентиль по отсортированному списку."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench(mode, homeworks, tenants, latency, cycles):
+    """Результат одного сценария."""
+    payload = make_payload(homeworks)
+    bot = utils.MockTelegramBot()
+    server = None
+    patches = []
+    if mode == 'stub':
+        patches.append(
+            mock.patch.object(requests, 'get', stub_get(payload, latency))
+        )
+        session = None
+    else:
+        server = start_stub_server(payload, latency)
+        endpoint = f'http://127.0.0.1:{server.server_port}/'
+        patches.append(mock.patch.object(homework, 'ENDPOINT', endpoint))
+        session = transport.Transport(pool_size=tenants, retries=0)
+    for patch in patches:
+        patch.start()
+    try:
+        run_scenario(bot, session, tenants, 1)
+        started = time.perf_counter()
+        durations = run_scenario(bot, session, tenants, cycles)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        run_scenario(bot, session, tenants, 1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        for patch in patches:
+            patch.stop()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if session is not None:
+            session.close()
+    return {
+        'mode': mode,
+        'homeworks': homeworks,
+        'tenants': tenants,
+        'latency_ms': latency * 1000,
+        'cycles_per_s': len(durations) / elapsed,
+        'p50_ms': percentile(durations, 0.50) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def main():
+    """Разбор аргументов и прогон всех сочетаний параметров."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', nargs='+', default=['stub', 'http'],
+                        choices=['stub', 'http'])
+    parser.add_argument('--homeworks', nargs='+', type=int,
+                        default=[1, 10, 100])
+    parser.add_argument('--tenants', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--latency-ms', nargs='+', type=float, default=[0])
+    parser.add_argument('--cycles', type=int, default=50,
+                        help='циклов на пользователя')
+    parser.add_argument('--json', action='store_true',
+                        help='вывод в формате JSON Lines')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    header = ('mode', 'homeworks', 'tenants', 'latency_ms', 'cycles_per_s',
+              'p50_ms', 'p99_ms', 'peak_kib')
+    if not args.json:
+        print(' '.join(f'{column:>12}' for column in header))
+    for mode in args.mode:
+        for homeworks in args.homeworks:
+            for tenants in args.tenants:
+                for latency in args.latency_ms:
+                    result = bench(
+                        mode, homeworks, tenants, latency / 1000, args.cycles
+                    )
+                    if args.json:
+                        print(json.dumps(result))
+                        continue
+                    print(' '.join(
+                        f'{result[column]:>12.1f}'
+                        if isinstance(result[column], float)
+                        else f'{result[column]:>12}'
+                        for column in header
+                    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Бенчмарк холодного старта бота.
+
+Запускает интерпретатор с -X importtime несколько раз и выводит медиану
+общего времени запуска, суммарного времени импортов и самые тяжёлые
+модули.
+Цель import только импортирует homework, цель once выполняет
+homework.py --once против локального симулятора API. С --budget-ms
+завершается с кодом 1, если медиана импорта превышает бюджет.
+
+    python benchmarks/bench_startup.py --target once --runs 10 --budget-ms 250
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from simulator import Simulator, World, token_name
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = {
+    'import': ['-c', 'import homework'],
+    'once': ['homework.py', '--once', '--state', '{state}'],
+}
+
+
+def parse_importtime(stderr):
+    """Словарь модуль -> (собственное, накопленное время) в микросекундах."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def run_once(target, env):
+    """Время запуска в секундах и разбор вывода -X importtime."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(env, LOG_FILE=os.path.join(directory, 'program.log'))
+        command = [
+            arg.format(state=os.path.join(directory, 'state.sqlite3'))
+            for arg in TARGETS[target]
+        ]
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', *command],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+            check=True,
+        )
+    return time.perf_counter() - started, parse_importtime(result.stderr)
+
+
+def bench(target, runs, top):
+    """Медианы по runs запускам и top модулей по собственному времени."""
+    env = dict(os.environ)
+    for name, value in (('PRACTICUM_TOKEN', 'sometoken'),
+                        ('TELEGRAM_TOKEN', '1234:abcdefg'),
+                        ('TELEGRAM_CHAT_ID', '12345')):
+        env.setdefault(name, value)
+    simulator = None
+    if target == 'once':
+        simulator = Simulator(World(1, transition=1e9)).start()
+        env.update(
+            PRACTICUM_ENDPOINT=simulator.url, PRACTICUM_TOKEN=token_name(0)
+        )
+    walls, imports, own = [], [], {}
+    try:
+        for _ in range(runs):
+            wall, modules = run_once(target, env)
+            walls.append(wall)
+            imports.append(sum(own for own, _ in modules.values()) / 1e6)
+            for name, (self_us, _) in modules.items():
+                own.setdefault(name, []).append(self_us / 1e6)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+    heaviest = sorted(
+        ((statistics.median(values), name) for name, values in own.items()),
+        reverse=True,
+    )[:top]
+    return {
+        'target': target,
+        'runs': runs,
+        'wall_ms': statistics.median(walls) * 1000,
+        'import_ms': statistics.median(imports) * 1000,
+        'top': [(name, seconds * 1000) for seconds, name in heaviest],
+    }
+
+
+def main():
+    """Разбор аргументов, прогон и проверка бюджета."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=sorted(TARGETS), default='import')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='сколько самых тяжёлых модулей показать')
+    parser.add_argument('--budget-ms', type=float,
+                        help='допустимая медиана суммарного времени импортов')
+    parser.add_argument('--json', action='store_true',
+                        help='вывод в формате JSON')
+    args = parser.parse_args()
+
+    result = bench(args.target, args.runs, args.top)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"запуск: {result['wall_ms']:.1f} мс, "
+              f"импорты: {result['import_ms']:.1f} мс")
+        for name, ms in result['top']:
+            print(f'{ms:>10.2f} мс  {name}')
+    if args.budget_ms is not None and result['import_ms'] > args.budget_ms:
+        print(f'Бюджет {args.budget_ms} мс превышен.', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
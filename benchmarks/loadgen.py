@@ -0,0 +1,172 @@
+"""Нагрузочный прогон бота против симулятора API Практикума.
+
+PollingEngine опрашивает симулятор (локальный или запущенный отдельно,
+--url) от имени tenants пользователей в течение duration секунд, а
+сообщения уходят в бот-заглушку. Выводятся запросы в секунду, коды
+ответов, число уведомлений и время восстановления после отказа API
+(--outage-at, --outage-seconds).
+
+    python benchmarks/loadgen.py --tenants 2000 --outage-seconds 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+for name, value in (('PRACTICUM_TOKEN', 'sometoken'),
+                    ('TELEGRAM_TOKEN', '1234:abcdefg'),
+                    ('TELEGRAM_CHAT_ID', '12345'),
+                    ('POLL_MIN_PERIOD', '1'),
+                    ('REVIEW_PERIOD', '1'),
+                    ('BREAKER_OPEN_SECONDS', '2')):
+    os.environ.setdefault(name, value)
+
+import engine  # noqa: E402
+import homework  # noqa: E402
+import metrics  # noqa: E402
+import transport  # noqa: E402
+from simulator import Simulator, World, token_name  # noqa: E402
+from storage import Outbox, StateStore  # noqa: E402
+
+
+class SimulatedBot:
+    """Бот-заглушка: считает сообщения и имитирует задержку телеграмма."""
+
+    def __init__(self, latency=0.0):
+        """Задержка отправки одного сообщения в секундах."""
+        self.latency = latency
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        """Учёт отправленного сообщения."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent += 1
+
+
+async def drive(polling, simulator, duration, outage_at, outage_seconds):
+    """Работа движка duration секунд с отказом API в заданный момент."""
+    async def outage():
+        await asyncio.sleep(outage_at)
+        simulator.outage(outage_seconds)
+
+    tasks = [asyncio.ensure_future(polling.run())]
+    if simulator is not None and outage_seconds:
+        tasks.append(asyncio.ensure_future(outage()))
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run(args, simulator):
+    """Прогон нагрузки и сводка результатов."""
+    tenants = [
+        engine.Tenant(
+            name=f'tenant-{index}',
+            token=token_name(index % args.tokens),
+            chat_id=str(index),
+            from_date=0,
+        )
+        for index in range(args.tenants)
+    ]
+    session = transport.Transport(pool_size=args.concurrency, retries=0)
+    bot = SimulatedBot(args.telegram_latency_ms / 1000)
+    polling = engine.PollingEngine(
+        bot, tenants, concurrency=args.concurrency, period=args.period,
+        session=session, state=StateStore(':memory:'),
+        outbox=Outbox(':memory:'),
+    )
+    failures = metrics.CYCLE_FAILURES.value()
+    responses = dict(simulator.responses) if simulator else {}
+    started = time.perf_counter()
+    try:
+        asyncio.run(drive(
+            polling, simulator, args.duration,
+            args.outage_at, args.outage_seconds,
+        ))
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    result = {
+        'tenants': args.tenants,
+        'duration_s': elapsed,
+        'notifications': bot.sent,
+        'cycle_failures': metrics.CYCLE_FAILURES.value() - failures,
+    }
+    if simulator is not None:
+        codes = {
+            code: count - responses.get(code, 0)
+            for code, count in simulator.responses.items()
+        }
+        result['requests_per_s'] = sum(codes.values()) / elapsed
+        result['responses'] = {str(code): codes[code] for code in codes}
+        if args.outage_seconds:
+            recovered = simulator.recovered.values()
+            result['recovered_tokens'] = len(simulator.recovered)
+            result['recovery_s'] = (
+                max(recovered) - simulator.outage_until if recovered else None
+            )
+    return result
+
+
+def main():
+    """Разбор аргументов, запуск симулятора и нагрузки."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='адрес уже запущенного симулятора')
+    parser.add_argument('--tenants', type=int, default=1000)
+    parser.add_argument('--tokens', type=int, default=None,
+                        help='различных токенов (по умолчанию = tenants)')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--period', type=int, default=5,
+                        help='период опроса одного пользователя, с')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--homeworks', type=int, default=3)
+    parser.add_argument('--transition', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--unauthorized-rate', type=float, default=0)
+    parser.add_argument('--telegram-latency-ms', type=float, default=0)
+    parser.add_argument('--outage-at', type=float, default=10,
+                        help='через сколько секунд начать отказ API')
+    parser.add_argument('--outage-seconds', type=float, default=0)
+    parser.add_argument('--json', action='store_true',
+                        help='вывод в формате JSON')
+    args = parser.parse_args()
+    args.tokens = args.tokens or args.tenants
+    logging.disable(logging.CRITICAL)
+
+    simulator = None
+    if args.url:
+        homework.ENDPOINT = args.url
+    else:
+        simulator = Simulator(
+            World(args.tokens, args.homeworks, args.transition),
+            latency=args.latency_ms / 1000, error_rate=args.error_rate,
+            unauthorized_rate=args.unauthorized_rate,
+        ).start()
+        homework.ENDPOINT = simulator.url
+    try:
+        result = run(args, simulator)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+    if args.json:
+        print(json.dumps(result))
+        return
+    for key, value in result.items():
+        if isinstance(value, float):
+            value = f'{value:.2f}'
+        print(f'{key:>16}: {value}')
+
+
+if __name__ == '__main__':
+    main()
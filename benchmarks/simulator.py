@@ -0,0 +1,274 @@
+"""Локальный симулятор API Практикума.
+
+Отвечает как ENDPOINT: проверяет заголовок OAuth и параметр from_date и
+отдаёт синтетические работы, статусы которых со временем меняются
+(reviewing -> rejected -> reviewing -> ... -> approved). Известны токены
+token-0, token-1, ... token-(N-1). Задержку ответа, долю ответов 500 и
+401 можно настроить.
+
+    python benchmarks/simulator.py --tokens 5000 --latency-ms 50
+
+Адрес для переменной PRACTICUM_ENDPOINT симулятор печатает при запуске.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = '/api/user_api/homework_statuses/'
+MAX_EVENTS = 10
+UNAUTHORIZED = {
+    'code': 'not_authenticated',
+    'message': 'Учетные данные не были предоставлены.',
+    'source': '__response__',
+}
+WRONG_FROM_DATE = {
+    'code': 'UnknownError',
+    'error': {'error': 'Wrong from_date format'},
+}
+SERVER_ERROR = {'code': 'server_error', 'message': 'Internal Server Error'}
+
+
+def token_name(index):
+    """Токен пользователя с номером index."""
+    return f'token-{index}'
+
+
+class World:
+    """Синтетические работы пользователей и история их статусов.
+
+    У каждого из tokens токенов homeworks работ. Статус работы меняется
+    в среднем раз в transition секунд, начиная с момента start. История
+    работ токена строится при первом обращении и зависит только от seed
+    и токена.
+    """
+
+    def __init__(self, tokens, homeworks=3, transition=60.0, seed=0,
+                 start=None):
+        """Число токенов, работ на токен и средний период смены статуса."""
+        self.tokens = tokens
+        self.homeworks = homeworks
+        self.transition = transition
+        self.seed = seed
+        self.start = time.time() if start is None else start
+        self._timelines = {}
+        self._lock = threading.Lock()
+
+    def knows(self, token):
+        """Выдан ли такой токен."""
+        prefix, _, index = token.partition('-')
+        return (prefix == 'token' and index.isdigit()
+                and int(index) < self.tokens)
+
+    def _timeline(self, token):
+        with self._lock:
+            timeline = self._timelines.get(token)
+            if timeline is not None:
+                return timeline
+        rng = random.Random(f'{self.seed}:{token}')
+        timeline = []
+        for number in range(self.homeworks):
+            moment = self.start + rng.uniform(0, self.transition)
+            events = [(moment, 'reviewing')]
+            while len(events) < MAX_EVENTS:
+                moment += rng.expovariate(1 / self.transition)
+                if events[-1][1] == 'rejected':
+                    events.append((moment, 'reviewing'))
+                elif rng.random() < 0.5:
+                    events.append((moment, 'rejected'))
+                else:
+                    events.append((moment, 'approved'))
+                    break
+            timeline.append((number, events))
+        with self._lock:
+            return self._timelines.setdefault(token, timeline)
+
+    def answer(self, token, from_date, now=None):
+        """Ответ API для токена: работы, изменившиеся с from_date."""
+        now = time.time() if now is None else now
+        homeworks = []
+        for number, events in self._timeline(token):
+            current = None
+            for moment, status in events:
+                if moment > now:
+                    break
+                current = moment, status
+            if current is None or current[0] < from_date:
+                continue
+            moment, status = current
+            homeworks.append({
+                'id': number,
+                'status': status,
+                'homework_name': f'{token}__hw{number}.zip',
+                'reviewer_comment': '',
+                'date_updated': time.strftime(
+                    '%Y-%m-%dT%H:%M:%SZ', time.gmtime(moment)
+                ),
+                'lesson_name': f'Проект {number}',
+            })
+        homeworks.sort(key=lambda work: work['date_updated'], reverse=True)
+        return {'homeworks': homeworks, 'current_date': int(now)}
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Обработка запросов к API_PATH."""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.server.simulator.record(status)
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Ответ в формате API Практикума."""
+        simulator = self.server.simulator
+        url = urlsplit(self.path)
+        if url.path != API_PATH:
+            self._send_json(HTTPStatus.NOT_FOUND, {'detail': 'Not found.'})
+            return
+        if simulator.latency:
+            time.sleep(simulator.latency)
+        scheme, _, token = self.headers.get('Authorization', '').partition(
+            ' '
+        )
+        if scheme != 'OAuth' or not simulator.world.knows(token):
+            self._send_json(HTTPStatus.UNAUTHORIZED, UNAUTHORIZED)
+            return
+        from_date = parse_qs(url.query).get('from_date', [''])[0]
+        if not from_date.lstrip('-').isdigit():
+            self._send_json(HTTPStatus.BAD_REQUEST, WRONG_FROM_DATE)
+            return
+        status = simulator.inject_error()
+        if status == HTTPStatus.UNAUTHORIZED:
+            self._send_json(status, UNAUTHORIZED)
+            return
+        if status is not None:
+            self._send_json(status, SERVER_ERROR)
+            return
+        answer = simulator.world.answer(token, int(from_date))
+        simulator.served(token)
+        self._send_json(HTTPStatus.OK, answer)
+
+    def log_message(self, format, *args):
+        """Запросы не логируются."""
+
+
+class Simulator:
+    """HTTP-сервер симулятора с учётом ответов и имитацией сбоев."""
+
+    def __init__(self, world, host='127.0.0.1', port=0, latency=0.0,
+                 error_rate=0.0, unauthorized_rate=0.0, seed=0):
+        """Мир работ, адрес сервера и параметры задержки и ошибок."""
+        self.world = world
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unauthorized_rate = unauthorized_rate
+        self.responses = Counter()
+        self.recovered = {}
+        self.outage_until = 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), SimulatorHandler)
+        self._server.daemon_threads = True
+        self._server.simulator = self
+
+    @property
+    def url(self):
+        """Адрес, подставляемый в PRACTICUM_ENDPOINT."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{API_PATH}'
+
+    def start(self):
+        """Запуск сервера в фоновом потоке."""
+        threading.Thread(
+            target=self._server.serve_forever, name='simulator', daemon=True
+        ).start()
+        return self
+
+    def serve_forever(self):
+        """Работа сервера в текущем потоке."""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Остановка сервера."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def outage(self, seconds):
+        """Отказ API: seconds секунд все запросы получают ответ 500."""
+        with self._lock:
+            self.outage_until = time.time() + seconds
+            self.recovered.clear()
+
+    def inject_error(self):
+        """Код ошибки для очередного запроса или None."""
+        with self._lock:
+            if time.time() < self.outage_until:
+                return HTTPStatus.INTERNAL_SERVER_ERROR
+            chance = self._rng.random()
+        if chance < self.error_rate:
+            return HTTPStatus.INTERNAL_SERVER_ERROR
+        if chance < self.error_rate + self.unauthorized_rate:
+            return HTTPStatus.UNAUTHORIZED
+        return None
+
+    def record(self, status):
+        """Учёт отданного ответа."""
+        with self._lock:
+            self.responses[int(status)] += 1
+
+    def served(self, token):
+        """Учёт первого успешного ответа токену после отказа."""
+        with self._lock:
+            if self.outage_until:
+                self.recovered.setdefault(token, time.time())
+
+
+def main():
+    """Запуск симулятора до прерывания."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--tokens', type=int, default=1000)
+    parser.add_argument('--homeworks', type=int, default=3,
+                        help='работ на токен')
+    parser.add_argument('--transition', type=float, default=60.0,
+                        help='средний период смены статуса, с')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='доля ответов 500')
+    parser.add_argument('--unauthorized-rate', type=float, default=0,
+                        help='доля ответов 401 для верных токенов')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    world = World(args.tokens, args.homeworks, args.transition, args.seed)
+    simulator = Simulator(
+        world, args.host, args.port, args.latency_ms / 1000,
+        args.error_rate, args.unauthorized_rate, args.seed,
+    )
+    print(f'PRACTICUM_ENDPOINT={simulator.url}')
+    print(f'Токены: {token_name(0)} ... {token_name(args.tokens - 1)}')
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
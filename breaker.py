@@ -0,0 +1,91 @@
+"""Автоматический выключатель запросов к API Практикума."""
+import os
+import threading
+import time
+from collections import deque
+
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', 20))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', 10))
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', 0.5))
+BREAKER_OPEN_SECONDS = int(os.getenv('BREAKER_OPEN_SECONDS', 300))
+BREAKER_PROBES = int(os.getenv('BREAKER_PROBES', 1))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Выключатель с состояниями closed, open и half_open.
+
+    В состоянии closed запросы проходят, а их исходы копятся в скользящем
+    окне из window последних вызовов. Когда доля неудач среди не менее
+    min_calls вызовов достигает failure_rate, выключатель размыкается
+    (open) и на open_seconds отклоняет все запросы. Затем он пропускает
+    probes пробных запросов (half_open): успех замыкает цепь, неудача
+    снова размыкает её.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE,
+                 open_seconds=BREAKER_OPEN_SECONDS, probes=BREAKER_PROBES,
+                 clock=time.monotonic):
+        """Параметры окна, порога и паузы выключателя."""
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_left = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def retry_in(self):
+        """Секунд до перехода в half_open, если цепь разомкнута."""
+        if self.state != OPEN:
+            return 0
+        return max(0.0, self._opened_at + self.open_seconds - self._clock())
+
+    def allow(self):
+        """Можно ли выполнить запрос сейчас."""
+        with self._lock:
+            if (self.state == OPEN
+                    and self._clock() - self._opened_at >= self.open_seconds):
+                self.state = HALF_OPEN
+                self._probes_left = self.probes
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_left > 0:
+                self._probes_left -= 1
+                return True
+            return False
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def record_success(self):
+        """Учёт успешного запроса."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        """Учёт неудачного запроса."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            calls = len(self._outcomes)
+            failures = calls - sum(self._outcomes)
+            if (calls >= self.min_calls
+                    and failures / calls >= self.failure_rate):
+                self._open()
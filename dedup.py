@@ -0,0 +1,114 @@
+"""Подавление повторяющихся сообщений об ошибках."""
+import os
+import re
+import time
+from collections import OrderedDict
+
+ERROR_WINDOW = int(os.getenv('ERROR_WINDOW', 3600))
+ERROR_CACHE_SIZE = int(os.getenv('ERROR_CACHE_SIZE', 256))
+
+_NUMBERS = re.compile(r'\d+')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(error):
+    """Отпечаток ошибки: тип и текст без чисел и лишних пробелов."""
+    message = _NUMBERS.sub('N', str(error))
+    return type(error).__name__, _SPACES.sub(' ', message).strip()
+
+
+class _Entry:
+    __slots__ = ('text', 'window_start', 'suppressed')
+
+    def __init__(self, text, now):
+        self.text = text
+        self.window_start = now
+        self.suppressed = 0
+
+
+class ErrorDeduplicator:
+    """Кэш отпечатков ошибок с окном window секунд и вытеснением LRU.
+
+    Первая ошибка с данным отпечатком отправляется, повторы внутри окна
+    только подсчитываются. По окончании окна summaries() возвращает
+    сводку вида «повторилась ещё N раз» и открывает новое окно.
+    """
+
+    def __init__(self, window=ERROR_WINDOW, max_size=ERROR_CACHE_SIZE,
+                 clock=time.monotonic):
+        """Длина окна в секундах и максимальное число отпечатков."""
+        self.window = window
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def observe(self, error):
+        """Учёт ошибки; True, если о ней нужно сообщить."""
+        key = fingerprint(error)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.window_start < self.window:
+            entry.suppressed += 1
+            self._entries.move_to_end(key)
+            return False
+        self._entries[key] = _Entry(str(error), now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return True
+
+    def forget(self, error):
+        """Удаление отпечатка, например если сообщение не отправилось."""
+        self._entries.pop(fingerprint(error), None)
+
+    def summaries(self):
+        """Сводки по ошибкам, окно которых закончилось."""
+        now = self._clock()
+        result = []
+        for key, entry in list(self._entries.items()):
+            if now - entry.window_start < self.window:
+                continue
+            if not entry.suppressed:
+                del self._entries[key]
+                continue
+            result.append(
+                f'Ошибка «{entry.text}» повторилась ещё '
+                f'{entry.suppressed} раз.'
+            )
+            entry.window_start = now
+            entry.suppressed = 0
+        return result
+
+
+class ChatErrorDeduplicator:
+    """Подавление повторов ошибок отдельно для каждого чата.
+
+    Если сообщение об ошибке дошло не до всех чатов, отпечаток забывается
+    только у тех, куда оно не дошло, и при повторе ошибки сообщение
+    получат лишь они.
+    """
+
+    def __init__(self, chat_ids, **kwargs):
+        """Чаты и параметры ErrorDeduplicator для каждого из них."""
+        self._chats = {
+            chat_id: ErrorDeduplicator(**kwargs) for chat_id in chat_ids
+        }
+
+    def observe(self, error):
+        """Учёт ошибки; список чатов, которым о ней нужно сообщить."""
+        return [
+            chat_id for chat_id, errors in self._chats.items()
+            if errors.observe(error)
+        ]
+
+    def forget(self, error, chat_id):
+        """Удаление отпечатка для чата, куда сообщение не отправилось."""
+        self._chats[chat_id].forget(error)
+
+    def summaries(self):
+        """Сводки по ошибкам: список пар (текст, чаты)."""
+        result = {}
+        for chat_id, errors in self._chats.items():
+            for summary in errors.summaries():
+                result.setdefault(summary, []).append(chat_id)
+        return list(result.items())
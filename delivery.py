@@ -0,0 +1,140 @@
+"""Очередь исходящих сообщений в телеграмм."""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import metrics
+from exeptions import SendMessageError
+
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 4))
+SEND_QUEUE_SIZE = int(os.getenv('SEND_QUEUE_SIZE', 1000))
+
+
+@dataclass
+class Outgoing:
+    """Сообщение в очереди и обработчики результата отправки."""
+
+    chat_id: str
+    text: str
+    on_sent: Optional[Callable[[], None]] = None
+    on_failed: Optional[Callable[[], None]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class SendQueue:
+    """Ограниченная очередь, которую разбирают несколько задач asyncio.
+
+    Опрос API только кладёт сообщения в очередь и не ждёт телеграмм. Если
+    очередь заполнена, offer() сразу возвращает False, а вызывающий код
+    откладывает сообщение до следующего цикла, поэтому недоступность
+    телеграмма не останавливает опрос. Отказы, ожидание в очереди, её
+    наибольшая длина и неудачные отправки попадают в метрики SEND_QUEUE_*
+    и SEND_FAILURES.
+    """
+
+    def __init__(self, send, workers=SEND_WORKERS, maxsize=SEND_QUEUE_SIZE):
+        """Корутина send(chat_id, text) бросает SendMessageError при сбое."""
+        self._send = send
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue = None
+        self._tasks = []
+        self.enqueued = 0
+        self.rejected = 0
+        self.sent = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def depth(self):
+        """Число сообщений, ожидающих отправки."""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """Запуск задач-отправителей в текущем цикле событий."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.workers)
+        ]
+
+    def offer(self, message):
+        """Постановка сообщения в очередь без ожидания."""
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            metrics.SEND_QUEUE_REJECTED.inc()
+            logging.warning(
+                f'Очередь сообщений заполнена ({self.maxsize}), '
+                'сообщение отложено.'
+            )
+            return False
+        self.enqueued += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+            metrics.SEND_QUEUE_MAX_DEPTH.set(self.max_depth)
+        return True
+
+    async def _deliver(self, message):
+        waited = time.monotonic() - message.enqueued_at
+        self.wait_seconds += waited
+        metrics.SEND_QUEUE_WAIT.observe(waited)
+        try:
+            await self._send(message.chat_id, message.text)
+        except SendMessageError:
+            self.failed += 1
+            metrics.SEND_FAILURES.inc()
+            callback = message.on_failed
+        except Exception:
+            logging.exception('Непредвиденная ошибка отправки сообщения.')
+            self.failed += 1
+            metrics.SEND_FAILURES.inc()
+            callback = message.on_failed
+        else:
+            self.sent += 1
+            callback = message.on_sent
+        if callback is not None:
+            callback()
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except Exception:
+                logging.exception('Сбой обработчика отправки сообщения.')
+            finally:
+                self._queue.task_done()
+
+    async def join(self):
+        """Ожидание отправки всех сообщений из очереди."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self):
+        """Остановка задач-отправителей."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self):
+        """Счётчики очереди для мониторинга."""
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'sent': self.sent,
+            'failed': self.failed,
+            'wait_seconds': self.wait_seconds,
+        }
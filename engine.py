@@ -0,0 +1,493 @@
+"""Асинхронный опрос API Практикума для многих пользователей сразу."""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+
+import telegram
+
+import homework
+import lifecycle
+import logsetup
+import metrics
+import profiling
+import transport
+from dedup import ChatErrorDeduplicator
+from delivery import Outgoing, SendQueue
+from lease import (LEASE_RENEW_INTERVAL, VOLATILE_LEASES, LeaseStore,
+                   lease_key)
+from ratelimit import RateLimitedBot
+from scheduler import CYCLE_BUDGET, PollScheduler
+from singleflight import SingleFlight
+from storage import OUTBOX_PURGE_INTERVAL, VOLATILE_OUTBOX, Outbox, StateStore
+
+TENANTS_FILE = os.getenv('TENANTS_FILE', 'tenants.json')
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', 16))
+OUTBOX_RETRY_INTERVAL = int(os.getenv('OUTBOX_RETRY_INTERVAL', 30))
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '') == '1'
+
+
+@dataclass
+class Tenant:
+    """Пара токен Практикума и чат телеграмма с состоянием опроса."""
+
+    name: str
+    token: str
+    chat_id: str
+    from_date: int = field(default_factory=lambda: int(time.time()))
+    statuses: dict = field(default_factory=dict)
+    errors: ChatErrorDeduplicator = field(default=None, repr=False)
+    scheduler: PollScheduler = field(default=None, repr=False)
+
+    def __post_init__(self):
+        """Учёт повторов ошибок по каждому чату пользователя."""
+        if self.errors is None:
+            self.errors = ChatErrorDeduplicator(self.recipients)
+
+    @property
+    def recipients(self):
+        """Чаты, получающие уведомления: chat_id может быть списком."""
+        return homework.parse_chat_ids(self.chat_id)
+
+    @property
+    def lease_key(self):
+        """Ключ аренды: чаты пользователя, как у homework.py."""
+        return lease_key(self.chat_id)
+
+    @property
+    def headers(self):
+        """Заголовки запроса к API с токеном пользователя."""
+        return {'Authorization': f'OAuth {self.token}'}
+
+
+def load_tenants(path=TENANTS_FILE):
+    """Загрузка списка пользователей из json-файла.
+
+    chat_id пользователя может быть строкой или списком чатов.
+    """
+    with open(path, encoding='utf-8') as file:
+        records = json.load(file)
+    tenants = []
+    for record in records:
+        chat_id = record['chat_id']
+        if isinstance(chat_id, list):
+            chat_id = ','.join(map(str, chat_id))
+        tenants.append(Tenant(
+            name=record.get('name', str(chat_id)),
+            token=record['token'],
+            chat_id=str(chat_id),
+        ))
+    return tenants
+
+
+class PollingEngine:
+    """Опрос API для многих пользователей в одном процессе.
+
+    Запросы к API и телеграмму блокирующие, поэтому выполняются в пуле
+    потоков, а число одновременных запросов ограничено семафором. Отправки
+    в телеграмм, которые могут подолгу ждать лимитов и RetryAfter, и
+    продление аренды идут через отдельные пулы и не занимают потоки
+    опроса. Запись состояния и выборка из outbox выполняются в отдельном
+    потоке, а не в цикле событий.
+    """
+
+    def __init__(self, bot, tenants, concurrency=POLL_CONCURRENCY,
+                 period=homework.RETRY_PERIOD, session=None, state=None,
+                 outbox=None, streaming=STREAM_RESPONSES,
+                 budget=CYCLE_BUDGET,
+                 shutdown_timeout=lifecycle.SHUTDOWN_TIMEOUT, leases=None):
+        """Бот, пользователи и ограничение числа одновременных запросов.
+
+        С leases (LeaseStore) опрашиваются только пользователи, аренду
+        которых держит этот экземпляр.
+        """
+        self.bot = bot
+        self.session = session or transport.get_transport()
+        self.state = state or StateStore()
+        self.outbox = outbox or Outbox()
+        self.tenants = list(tenants)
+        for tenant in self.tenants:
+            tenant.from_date = self.state.load_cursor(
+                tenant.name, tenant.from_date
+            )
+            tenant.statuses = self.state.load_statuses(tenant.name)
+            tenant.scheduler = PollScheduler(period)
+        self.concurrency = concurrency
+        self.period = period
+        self.streaming = streaming
+        self.budget = budget
+        self.shutdown_timeout = shutdown_timeout
+        self.leases = leases
+        self._leading = set()
+        self._wake = asyncio.Event()
+        self._polling = None
+        self._stopping = False
+        self._subscribers = Counter(tenant.token for tenant in self.tenants)
+        self._flights = SingleFlight()
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix='poll'
+        )
+        self.outgoing = SendQueue(self._deliver)
+        self._send_executor = ThreadPoolExecutor(
+            max_workers=self.outgoing.workers, thread_name_prefix='send'
+        )
+        self._lease_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='lease'
+        )
+        self._state_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='state'
+        )
+        metrics.QUEUE_DEPTH.set_function(
+            lambda: self.outgoing.depth, queue='send'
+        )
+        metrics.QUEUE_DEPTH.set_function(self.outbox.pending, queue='outbox')
+
+    async def _call(self, func, *args, executor=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor or self._executor, profiling.PROFILER.call, func, *args
+        )
+
+    async def _deliver(self, chat_id, message):
+        await self._call(
+            homework.send_to_chat, self.bot, chat_id, message,
+            executor=self._send_executor,
+        )
+
+    async def flush_outbox(self):
+        """Постановка в очередь отправки всех сообщений, которые пора слать.
+
+        Сообщение, не поместившееся в очередь, остаётся в outbox и будет
+        выбрано снова после истечения OUTBOX_CLAIM_TIMEOUT.
+        """
+        due = await self._call(
+            self.outbox.due, executor=self._state_executor
+        )
+        for key, chat_id, text in due:
+            queued = self.outgoing.offer(Outgoing(
+                chat_id,
+                text,
+                on_sent=partial(self.outbox.done, key),
+                on_failed=partial(self.outbox.retry_later, key),
+            ))
+            if not queued:
+                break
+
+    def _notify(self, tenant, work):
+        answer = homework.parse_status(work)
+        logging.debug(f'{tenant.name}: {answer}')
+        key = homework.notification_key(tenant.name, work)
+        recipients = tenant.recipients
+        for chat_id in recipients:
+            self.outbox.add(
+                key if len(recipients) == 1 else f'{key}:{chat_id}',
+                tenant.name, chat_id, answer
+            )
+        tenant.statuses[homework.homework_key(work)] = work.get('status')
+
+    def _report(self, tenant, error=None):
+        for summary, chat_ids in tenant.errors.summaries():
+            for chat_id in chat_ids:
+                self.outgoing.offer(Outgoing(chat_id, summary))
+        if error is None:
+            return
+        for chat_id in tenant.errors.observe(error):
+            self.outgoing.offer(Outgoing(
+                chat_id,
+                f'Сбой в работе программы: {error}.',
+                on_failed=partial(tenant.errors.forget, error, chat_id),
+            ))
+
+    def _read_changes(self, tenant, answer):
+        defects = []
+        with metrics.stage('json_decode'):
+            changed = homework.diff_statuses(
+                tenant.statuses,
+                homework.HOMEWORK_SCHEMA.filter(answer, defects)
+            )
+        return changed, answer.current_date, defects
+
+    def _read_valid(self, answer):
+        defects = []
+        with metrics.stage('json_decode'):
+            homeworks = list(homework.HOMEWORK_SCHEMA.filter(answer, defects))
+        return homeworks, answer.current_date, defects
+
+    async def _fetch_valid(self, headers, from_date):
+        """Корректные работы из ответа API, current_date и нарушения."""
+        timestamp = {'from_date': from_date}
+        async with self._semaphore:
+            if self.streaming:
+                answer = await self._call(
+                    homework.fetch_homeworks_stream,
+                    headers, timestamp, self.session,
+                )
+                return await self._call(self._read_valid, answer)
+            response = await self._call(
+                homework.fetch_homeworks, headers, timestamp, self.session,
+            )
+        homework.check_response(response)
+        homeworks, defects = homework.check_homeworks(response['homeworks'])
+        return homeworks, response.get('current_date'), defects
+
+    async def _fetch_shared(self, tenant):
+        """Один запрос за всех пользователей с токеном tenant.
+
+        Запрос идёт с самым ранним from_date среди них, чтобы ответ
+        покрывал курсор каждого.
+        """
+        from_date = min(
+            other.from_date for other in self.tenants
+            if other.token == tenant.token
+        )
+        return await self._fetch_valid(tenant.headers, from_date)
+
+    async def _fetch_changes(self, tenant):
+        """Изменившиеся работы, current_date и нарушения схемы в ответе.
+
+        Пользователи с общим токеном ждут один запрос с ключом по токену,
+        даже если их курсоры и расписания разошлись. Из общего ответа
+        каждому достаются работы, обновлённые не раньше его from_date, а
+        изменения ищутся по его статусам. В потоковом режиме для
+        единственного владельца токена тело ответа читается и разбирается
+        по одной работе, и в память попадают только изменившиеся.
+        """
+        if self._subscribers[tenant.token] > 1:
+            homeworks, current_date, defects = await self._flights.do(
+                tenant.token, self._fetch_shared, tenant
+            )
+            homeworks = [
+                work for work in homeworks
+                if homework.updated_since(work, tenant.from_date)
+            ]
+        elif self.streaming:
+            timestamp = {'from_date': tenant.from_date}
+            async with self._semaphore:
+                answer = await self._call(
+                    homework.fetch_homeworks_stream,
+                    tenant.headers, timestamp, self.session,
+                )
+                return await self._call(self._read_changes, tenant, answer)
+        else:
+            homeworks, current_date, defects = await self._fetch_valid(
+                tenant.headers, tenant.from_date
+            )
+        changed = homework.diff_statuses(tenant.statuses, homeworks)
+        return changed, current_date, defects
+
+    def _record(self, tenant, changed, current_date):
+        for work in changed:
+            self._notify(tenant, work)
+        tenant.from_date = current_date or tenant.from_date
+        self.state.save(tenant.name, tenant.from_date, tenant.statuses)
+
+    async def _cycle(self, tenant):
+        changed, current_date, defects = await self._fetch_changes(tenant)
+        await self._call(
+            self._record, tenant, changed, current_date,
+            executor=self._state_executor,
+        )
+        metrics.LAST_SUCCESSFUL_POLL.set(time.time())
+        await self.flush_outbox()
+        homework.raise_for_defects(defects)
+
+    def _lead(self, tenant):
+        """Держит ли экземпляр аренду пользователя.
+
+        Когда аренда получена заново, курсор и статусы перечитываются из
+        базы: пока её держал другой экземпляр, он их обновлял.
+        """
+        if self.leases is None:
+            return True
+        if not self.leases.held(tenant.lease_key):
+            self._leading.discard(tenant.name)
+            return False
+        if tenant.name not in self._leading:
+            self._leading.add(tenant.name)
+            tenant.from_date = self.state.load_cursor(
+                tenant.name, tenant.from_date
+            )
+            tenant.statuses = self.state.load_statuses(tenant.name)
+        return True
+
+    async def poll(self, tenant):
+        """Один цикл опроса API для пользователя.
+
+        Цикл ограничен бюджетом budget секунд: не уложившийся цикл
+        отменяется, учитывается в CYCLE_OVERRUNS и переносится как
+        неудачный. Возвращает паузу до следующего цикла для пользователя.
+        Пользователь, аренду которого держит другой экземпляр, не
+        опрашивается до следующего продления аренды.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if not self._lead(tenant):
+            return LEASE_RENEW_INTERVAL
+        try:
+            with profiling.PROFILER.cycle():
+                await asyncio.wait_for(self._cycle(tenant), self.budget)
+            self._report(tenant)
+            return tenant.scheduler.success(tenant.statuses)
+        except asyncio.TimeoutError:
+            metrics.CYCLE_OVERRUNS.inc()
+            error = TimeoutError(
+                f'цикл опроса не уложился в {self.budget} с'
+            )
+            logging.warning(f'{tenant.name}: {error}.')
+            self._report(tenant, error)
+            return tenant.scheduler.failure(error)
+        except Exception as error:
+            metrics.CYCLE_FAILURES.inc()
+            logging.error(
+                f'{tenant.name}: Сбой в работе программы: {error}.',
+                exc_info=True
+            )
+            self._report(tenant, error)
+            return tenant.scheduler.failure(error)
+
+    async def _sleep(self, delay):
+        """Пауза до следующего опроса, которую прерывает request_poll."""
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_forever(self, tenant, delay):
+        await self._sleep(delay)
+        while True:
+            await self._sleep(await self.poll(tenant))
+
+    def _lease_keys(self):
+        return list(dict.fromkeys(tenant.lease_key for tenant in self.tenants))
+
+    async def _renew_leases(self):
+        try:
+            await self._call(
+                self.leases.acquire, self._lease_keys(),
+                executor=self._lease_executor,
+            )
+        except sqlite3.Error as error:
+            logging.error(f'Аренда не продлена: {error}.')
+
+    async def _renew_forever(self):
+        while True:
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+            await self._renew_leases()
+
+    async def _retry_forever(self):
+        while True:
+            await self.flush_outbox()
+            await asyncio.sleep(OUTBOX_RETRY_INTERVAL)
+
+    async def _purge_forever(self):
+        while True:
+            try:
+                await self._call(
+                    self.outbox.purge, executor=self._state_executor
+                )
+            except sqlite3.Error as error:
+                logging.error(f'Outbox не очищен: {error}.')
+            await asyncio.sleep(OUTBOX_PURGE_INTERVAL)
+
+    def request_poll(self):
+        """Немедленный опрос всех пользователей (SIGUSR1)."""
+        logging.info('Получен сигнал на немедленный опрос.')
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    def request_stop(self):
+        """Остановка опроса с доотправкой уведомлений (SIGTERM)."""
+        logging.info('Остановка: доотправка уведомлений.')
+        self._stopping = True
+        if self._polling is not None:
+            self._polling.cancel()
+
+    async def _drain(self):
+        await self.flush_outbox()
+        try:
+            await asyncio.wait_for(
+                self.outgoing.join(), self.shutdown_timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning('Не все уведомления отправлены до остановки.')
+
+    async def run(self, handle_signals=False):
+        """Опрос всех пользователей до вызова request_stop.
+
+        Первые запросы равномерно распределены по периоду опроса, чтобы не
+        отправлять все запросы к API одновременно. Пользователи с общим
+        токеном стартуют вместе, чтобы их запросы объединялись. При
+        остановке уведомления из outbox отправляются не дольше
+        shutdown_timeout секунд. С handle_signals SIGUSR1 вызывает
+        request_poll, а SIGTERM — request_stop.
+        """
+        if handle_signals:
+            loop = asyncio.get_running_loop()
+            if lifecycle.POLL_SIGNAL is not None:
+                loop.add_signal_handler(
+                    lifecycle.POLL_SIGNAL, self.request_poll
+                )
+            loop.add_signal_handler(lifecycle.STOP_SIGNAL, self.request_stop)
+        tokens = list(dict.fromkeys(tenant.token for tenant in self.tenants))
+        count = max(len(tokens), 1)
+        offsets = {
+            token: self.period * index / count
+            for index, token in enumerate(tokens)
+        }
+        background = [self._retry_forever(), self._purge_forever()]
+        if self.leases is not None:
+            await self._renew_leases()
+            background.append(self._renew_forever())
+        self._polling = asyncio.gather(*background, *(
+            self._poll_forever(tenant, offsets[tenant.token])
+            for tenant in self.tenants
+        ))
+        try:
+            await self._polling
+        except asyncio.CancelledError:
+            if not self._stopping:
+                raise
+            await self._drain()
+        finally:
+            await self.outgoing.stop()
+            if self.leases is not None:
+                self.leases.release(self._lease_keys())
+            for executor in (self._executor, self._send_executor,
+                             self._lease_executor, self._state_executor):
+                executor.shutdown(wait=False)
+
+
+def main():
+    """Запуск опроса для всех пользователей из TENANTS_FILE."""
+    if not homework.TELEGRAM_TOKEN:
+        logging.critical('Отсутствуют необходимый токен: TELEGRAM_TOKEN!')
+        raise SystemExit('Нет необходимых токенов.')
+    bot = RateLimitedBot(telegram.Bot(token=homework.TELEGRAM_TOKEN))
+    tenants = load_tenants()
+    logging.info(f'Загружено пользователей: {len(tenants)}.')
+    polling = PollingEngine(bot, tenants, leases=LeaseStore())
+    if not polling.outbox.durable:
+        logging.warning(VOLATILE_OUTBOX)
+    if not polling.leases.durable:
+        logging.warning(VOLATILE_LEASES)
+    asyncio.run(polling.run(handle_signals=True))
+    logging.info('Опрос остановлен.')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        handlers=[logsetup.start_queue_logging()],
+        format='%(asctime)s, %(levelname)s, %(message)s',
+    )
+    metrics.start_http_server()
+    profiling.PROFILER.install_signal()
+
+    main()
@@ -1,6 +1,3 @@
-from requests import RequestException
-
-
 class SendMessageError(Exception):
     """ Base class for send message errors. """
 
@@ -8,8 +5,41 @@ class SendMessageError(Exception):
         pass
 
 
-class GetAPIError(RequestException):
+class GetAPIError(Exception):
     """ Base class for get API errors. """
 
     def __init__(self, *args, **kwargs):
         pass
+
+
+class TooManyRequestsError(GetAPIError):
+    """ API answered 429, retry_after holds the requested pause. """
+
+    def __init__(self, *args, retry_after=None, **kwargs):
+        self.retry_after = retry_after
+
+
+class ResponseSchemaError(TypeError):
+    """ API response does not match the schema, defects lists all problems. """
+
+    def __init__(self, message='', defects=()):
+        super().__init__(message)
+        self.defects = list(defects)
+
+
+class CircuitOpenError(GetAPIError):
+    """ Requests to the API are suspended by the circuit breaker. """
+
+    def __init__(self, *args, retry_after=None, **kwargs):
+        self.retry_after = retry_after
+
+
+class PartialDeliveryError(SendMessageError):
+    """ Message reached only some recipients, failed lists the others. """
+
+    def __init__(self, *args, failed=(), **kwargs):
+        self.failed = list(failed)
+
+
+class DeadlineExceededError(SendMessageError):
+    """ Sending would overrun the cycle budget, the message is left queued. """
@@ -0,0 +1,57 @@
+"""Параллельная отправка одного сообщения нескольким получателям."""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', 8))
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий ограниченный пул потоков для рассылки."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ThreadPoolExecutor(
+                max_workers=FANOUT_WORKERS, thread_name_prefix='fanout'
+            )
+        return _shared
+
+
+def fan_out(send, recipients, message, executor=None):
+    """Вызов send(recipient, message) для каждого получателя.
+
+    Возвращает словарь получатель -> исключение или None при успехе.
+    Одному получателю сообщение отправляется без пула потоков. Потоки
+    пула видят контекстные переменные вызывающего, например бюджет
+    отправки ratelimit.SEND_DEADLINE, и попадают в профиль циклов.
+    """
+    recipients = list(dict.fromkeys(recipients))
+    if len(recipients) == 1:
+        futures = None
+    else:
+        executor = executor or get_executor()
+        futures = {
+            recipient: executor.submit(
+                contextvars.copy_context().run,
+                profiling.PROFILER.call, send, recipient, message
+            )
+            for recipient in recipients
+        }
+    results = {}
+    for recipient in recipients:
+        try:
+            if futures is None:
+                send(recipient, message)
+            else:
+                futures[recipient].result()
+        except Exception as error:
+            results[recipient] = error
+        else:
+            results[recipient] = None
+    return results
@@ -1,15 +1,35 @@
+import argparse
+import calendar
 import logging
 import os
 import sys
 import time
+from functools import partial
 from http import HTTPStatus
 
-import requests
-import telegram
-
 from dotenv import load_dotenv
 
-from exeptions import GetAPIError, SendMessageError
+import breaker
+import lifecycle
+import logsetup
+import metrics
+import profiling
+from dedup import ChatErrorDeduplicator
+from exeptions import (CircuitOpenError, DeadlineExceededError, GetAPIError,
+                       PartialDeliveryError, ResponseSchemaError,
+                       SendMessageError, TooManyRequestsError)
+from fanout import fan_out
+from lazy import LazyObject, lazy_import
+from lease import VOLATILE_LEASES, LeaseKeeper, LeaseStore, lease_key
+from ratelimit import RateLimitedBot, send_deadline
+from schema import Field, compile_schema, describe
+from scheduler import Deadline, PollScheduler
+from storage import (OUTBOX_PURGE_INTERVAL, STATE_DB, VOLATILE_OUTBOX, Outbox,
+                     StateStore)
+from streaming import StreamedAnswer
+
+requests = lazy_import('requests')
+telegram = lazy_import('telegram')
 
 load_dotenv()
 
@@ -17,9 +37,18 @@ load_dotenv()
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+ENDPOINT = os.getenv(
+    'PRACTICUM_ENDPOINT',
+    'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+)
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 RETRY_PERIOD = 600
+STREAM_CHUNK_SIZE = 64 * 1024
+API_TIMEOUT = (
+    float(os.getenv('API_CONNECT_TIMEOUT', 5)),
+    float(os.getenv('API_READ_TIMEOUT', 30)),
+)
+SEND_TIMEOUT = float(os.getenv('SEND_TIMEOUT', 10))
 
 
 HOMEWORK_VERDICTS = {
@@ -28,6 +57,20 @@ HOMEWORK_VERDICTS = {
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
 
+RESPONSE_SCHEMA = compile_schema({
+    'homeworks': Field(list),
+    'current_date': Field(int, required=False),
+})
+HOMEWORK_SCHEMA = compile_schema({
+    'homework_name': Field(str),
+    'status': Field(str, choices=HOMEWORK_VERDICTS),
+})
+
+API_BREAKER = breaker.CircuitBreaker()
+metrics.CIRCUIT_STATE.set_function(
+    lambda: breaker.STATE_CODES[API_BREAKER.state]
+)
+
 
 def check_tokens():
     """Проверка корректности указанных токенов."""
@@ -43,101 +86,454 @@ def check_tokens():
     return True
 
 
-def send_message(bot, message):
-    """Отправка сообщения в телеграмм."""
+@metrics.timed('send_message')
+def send_to_chat(bot, chat_id, message):
+    """Отправка сообщения в указанный чат телеграмма."""
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
+        bot.send_message(chat_id, message, timeout=SEND_TIMEOUT)
         logging.debug('Сообщение отправлено.')
     except telegram.error.TelegramError as error:
         logging.error(f'Сообщение не отправлено! {error}.', exc_info=True)
         raise SendMessageError(f'Сообщение не отправлено! {error}')
 
 
-def get_api_answer(timestamp):
-    """Получение ответа от API."""
+def parse_chat_ids(value):
+    """Список чатов из строки вида «123» или «123, 456»."""
+    return [chat.strip() for chat in str(value).split(',') if chat.strip()]
+
+
+def send_message(bot, message):
+    """Отправка сообщения в телеграмм во все чаты TELEGRAM_CHAT_ID.
+
+    Чатов может быть несколько через запятую, сообщение уходит в них
+    параллельно. Если оно дошло не до всех, PartialDeliveryError
+    перечисляет в failed чаты, куда отправить не удалось.
+    """
+    chat_ids = parse_chat_ids(TELEGRAM_CHAT_ID)
+    results = fan_out(partial(send_to_chat, bot), chat_ids, message)
+    failed = [chat for chat, error in results.items() if error is not None]
+    if failed and len(failed) == len(results):
+        raise results[failed[0]]
+    if failed:
+        raise PartialDeliveryError(
+            f'Сообщение не отправлено в чаты: {", ".join(failed)}.',
+            failed=failed,
+        )
+
+
+def check_status_code(response):
+    """Проверка кода ответа API."""
+    if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+        retry_after = response.headers.get('Retry-After', '')
+        raise TooManyRequestsError(
+            'Превышен лимит запросов к API.',
+            retry_after=int(retry_after) if retry_after.isdigit() else None
+        )
+    if response.status_code != HTTPStatus.OK:
+        raise ConnectionError(
+            f'Нет ответа, код ошибки: {response.status_code}.'
+        )
+
+
+@metrics.timed('get_api_answer')
+def request_api(headers, timestamp, session=None, **kwargs):
+    """GET-запрос к API через сессию или requests.get.
+
+    Запросы всех пользователей проходят через общий API_BREAKER: пока
+    API отвечает ошибками 5xx, 429 или не отвечает, новые запросы
+    отклоняются без обращения к серверу.
+    """
+    if not API_BREAKER.allow():
+        raise CircuitOpenError(
+            'API недоступно, запросы приостановлены на '
+            f'{API_BREAKER.retry_in:.0f} с.',
+            retry_after=API_BREAKER.retry_in
+        )
+    http = session or requests
+    kwargs.setdefault('timeout', API_TIMEOUT)
     try:
-        response = requests.get(ENDPOINT, headers=HEADERS, params=timestamp)
-        if response.status_code != HTTPStatus.OK:
-            raise ConnectionError(
-                f'Нет ответа, код ошибки: {response.status_code}.'
-            )
-    except requests.RequestException('Something wrong'):
+        response = http.get(
+            ENDPOINT, headers=headers, params=timestamp, **kwargs
+        )
+    except requests.RequestException as error:
+        API_BREAKER.record_failure()
         raise GetAPIError(
             f'Нет ответа на запрос! Параметры запроса: '
-            f'{ENDPOINT}, {HEADERS}, {timestamp}.'
+            f'{ENDPOINT}, {timestamp}. {error}'
         )
-    return response.json()
+    if (response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            or response.status_code == HTTPStatus.TOO_MANY_REQUESTS):
+        API_BREAKER.record_failure()
+    else:
+        API_BREAKER.record_success()
+    check_status_code(response)
+    return response
 
 
+def fetch_homeworks(headers, timestamp, session=None):
+    """Запрос статусов домашних работ с заданными заголовками.
+
+    Если передана сессия с пулом соединений (transport.Transport), запрос
+    выполняется через неё, иначе через requests.get.
+    """
+    response = request_api(headers, timestamp, session)
+    with metrics.stage('json_decode'):
+        return response.json()
+
+
+def fetch_homeworks_stream(headers, timestamp, session=None):
+    """Запрос статусов с потоковым разбором тела ответа.
+
+    Работы читаются из сети по одной при обходе результата, поэтому
+    память не растёт с длиной истории.
+    """
+    response = request_api(headers, timestamp, session, stream=True)
+    return StreamedAnswer(
+        response.iter_content(STREAM_CHUNK_SIZE), response.close
+    )
+
+
+def get_api_answer(timestamp):
+    """Получение ответа от API."""
+    return fetch_homeworks(HEADERS, timestamp)
+
+
+@metrics.timed('check_response')
 def check_response(response):
     """Проверка ответа."""
-    if not (isinstance(response, dict)
-            and isinstance(response.get('homeworks'), list)):
-        raise TypeError('Неверный формат данных.')
-    if 'homeworks' not in response:
-        raise KeyError('Нет такого ключа.')
+    defects = RESPONSE_SCHEMA(response)
+    if defects:
+        raise ResponseSchemaError(
+            f'Неверный формат данных: {describe(defects)}.', defects
+        )
     return True
 
 
+def check_homeworks(homeworks):
+    """Проверка всех работ ответа за один проход.
+
+    Возвращает пару: корректные работы и нарушения схемы в остальных.
+    """
+    return HOMEWORK_SCHEMA.validate_many(homeworks)
+
+
+def raise_for_defects(defects):
+    """Исключение со всеми нарушениями схемы, если они есть."""
+    if defects:
+        raise ResponseSchemaError(
+            f'Некорректные работы в ответе API: {describe(defects)}.',
+            defects
+        )
+
+
+@metrics.timed('parse_status')
 def parse_status(homework):
     """Обновление статуса проверки работы."""
-    if 'homework_name' not in homework:
-        raise KeyError("В API домашки нет ключа 'homework_name'.")
-    if 'status' not in homework:
-        raise KeyError("В API домашки нет ключа 'status'.")
-    if homework.get('status') not in HOMEWORK_VERDICTS:
-        raise KeyError('Недокументированный статус домашней работы.')
-
+    raise_for_defects(HOMEWORK_SCHEMA(homework))
     verdict = HOMEWORK_VERDICTS.get(homework.get('status'))
     homework_name = homework.get('homework_name')
     return f'Изменился статус проверки работы "{homework_name}". {verdict}'
 
 
+def homework_key(homework):
+    """Ключ работы в словаре статусов: id, а при его отсутствии название."""
+    return str(homework.get('id', homework.get('homework_name')))
+
+
+def updated_since(homework, from_date):
+    """Обновлялась ли работа не раньше метки времени from_date.
+
+    Работа без даты обновления или с датой в неизвестном формате
+    считается обновлённой.
+    """
+    try:
+        updated = calendar.timegm(time.strptime(
+            homework['date_updated'], '%Y-%m-%dT%H:%M:%SZ'
+        ))
+    except (KeyError, TypeError, ValueError):
+        return True
+    return updated >= from_date
+
+
+def diff_statuses(statuses, homeworks):
+    """Работы из ответа API, статус которых отличается от известного.
+
+    Если работа встречается в списке несколько раз, учитывается первая
+    (самая свежая) запись. Работы возвращаются от старых к новым.
+    """
+    seen = set()
+    changed = []
+    for homework in homeworks:
+        key = homework_key(homework)
+        if key in seen:
+            continue
+        seen.add(key)
+        if statuses.get(key) != homework.get('status'):
+            changed.append(homework)
+    changed.reverse()
+    return changed
+
+
+def notification_key(tenant, homework):
+    """Ключ идемпотентности уведомления о смене статуса работы."""
+    return ':'.join((
+        str(tenant),
+        homework_key(homework),
+        str(homework.get('status')),
+        str(homework.get('date_updated')),
+    ))
+
+
+def deliver_pending(bot, outbox, deadline=None, leading=None):
+    """Отправка уведомлений из outbox, неудачные откладываются.
+
+    Если бюджет цикла deadline исчерпан, оставшиеся уведомления остаются
+    в outbox до следующего цикла. Бюджет действует и внутри отправки:
+    паузы ограничителя и RetryAfter, которые в него не укладываются, не
+    выжидаются. leading — функция без аргументов, проверяющая аренду
+    пользователя: если аренду перехватил другой экземпляр, уведомления
+    тоже остаются в outbox. В outbox у каждого чата своя запись, поэтому
+    повтор не задевает тех, кто сообщение уже получил.
+    """
+    with send_deadline(deadline):
+        for key, chat_id, text in outbox.due():
+            if (deadline is not None and deadline.expired
+                    or leading is not None and not leading()):
+                outbox.release(key)
+                continue
+            try:
+                if chat_id == str(TELEGRAM_CHAT_ID):
+                    send_message(bot, text)
+                else:
+                    send_to_chat(bot, chat_id, text)
+            except DeadlineExceededError:
+                outbox.release(key)
+            except SendMessageError:
+                outbox.retry_later(key)
+            else:
+                outbox.done(key)
+
+
+def report_errors(bot, errors, error=None):
+    """Сводки по подавленным повторам и сообщение о новой ошибке.
+
+    Повторы учитываются в errors (ChatErrorDeduplicator) по каждому чату,
+    поэтому после частичной доставки сообщение об ошибке повторно уйдёт
+    только в чаты, куда оно не дошло.
+    """
+    send = partial(send_to_chat, bot)
+    for summary, chat_ids in errors.summaries():
+        fan_out(send, chat_ids, summary)
+    if error is None:
+        return
+    chat_ids = errors.observe(error)
+    if not chat_ids:
+        return
+    results = fan_out(send, chat_ids, f'Сбой в работе программы: {error}.')
+    for chat_id, failure in results.items():
+        if failure is not None:
+            errors.forget(error, chat_id)
+
+
+def poll_cycle(bot, state, outbox, timestamp, statuses, deadline=None,
+               leading=None):
+    """Один цикл: запрос к API, поиск изменений, сохранение и отправка.
+
+    Курсор timestamp и статусы statuses обновляются на месте и
+    сохраняются в state до отправки уведомлений из outbox. Для каждого
+    чата из TELEGRAM_CHAT_ID уведомление записывается отдельно, как в
+    engine.py, чтобы записи мог отправить и движок с общей базой.
+    Отправка идёт, только пока leading() подтверждает аренду.
+    """
+    response = get_api_answer(timestamp)
+    check_response(response)
+    homeworks, defects = check_homeworks(response.get('homeworks'))
+    recipients = parse_chat_ids(TELEGRAM_CHAT_ID)
+    for homework in diff_statuses(statuses, homeworks):
+        answer = parse_status(homework)
+        logging.debug(answer)
+        key = notification_key(TELEGRAM_CHAT_ID, homework)
+        for chat_id in recipients:
+            outbox.add(
+                key if len(recipients) == 1 else f'{key}:{chat_id}',
+                TELEGRAM_CHAT_ID, chat_id, answer
+            )
+        statuses[homework_key(homework)] = homework.get('status')
+    timestamp['from_date'] = response.get(
+        'current_date', timestamp['from_date']
+    )
+    state.save(TELEGRAM_CHAT_ID, timestamp['from_date'], statuses)
+    metrics.LAST_SUCCESSFUL_POLL.set(time.time())
+    deliver_pending(bot, outbox, deadline, leading)
+    raise_for_defects(defects)
+
+
+def run_once(state_path=STATE_DB):
+    """Один цикл опроса для запуска по расписанию (cron, таймер systemd).
+
+    Курсор, статусы и неотправленные уведомления читаются из базы
+    state_path и сохраняются в неё же. Ошибка не отправляется в
+    телеграмм, а только логируется: без процесса, живущего между
+    запусками, повторы одной ошибки не подавить. Если пользователя
+    опрашивает другой экземпляр бота, запуск пропускается. Цикл может
+    длиться дольше LEASE_TTL, поэтому аренда продлевается всё время
+    запуска. Возвращает код завершения: 0 при успехе, 1 при сбое.
+    """
+    check_tokens()
+    leases = LeaseStore(state_path)
+    key = lease_key(TELEGRAM_CHAT_ID)
+    keeper = LeaseKeeper(leases, [key]).start()
+    try:
+        if not leases.held(key):
+            logging.info('Опрос ведёт другой экземпляр бота, пропуск.')
+            return 0
+        return poll_once(state_path, partial(leases.held, key))
+    finally:
+        keeper.stop()
+        leases.close()
+
+
+def poll_once(state_path, leading=None):
+    """Цикл опроса run_once с состоянием из базы state_path.
+
+    Бот создаётся, только если есть что отправить, поэтому запуск без
+    изменений не загружает python-telegram-bot.
+    """
+    bot = LazyObject(
+        lambda: RateLimitedBot(telegram.Bot(token=TELEGRAM_TOKEN))
+    )
+    state = StateStore(state_path)
+    outbox = Outbox(state_path)
+    timestamp = {
+        'from_date': state.load_cursor(TELEGRAM_CHAT_ID, int(time.time()))
+    }
+    statuses = state.load_statuses(TELEGRAM_CHAT_ID)
+    try:
+        with profiling.PROFILER.cycle():
+            outbox.purge()
+            poll_cycle(
+                bot, state, outbox, timestamp, statuses, Deadline(), leading
+            )
+    except Exception as error:
+        metrics.CYCLE_FAILURES.inc()
+        logging.error(f'Сбой в работе программы: {error}.', exc_info=True)
+        return 1
+    finally:
+        state.close()
+        outbox.close()
+    return 0
+
+
+def parse_args(argv=None):
+    """Разбор аргументов командной строки."""
+    parser = argparse.ArgumentParser(
+        description='Телеграм-бот для проверки статуса домашних работ.'
+    )
+    parser.add_argument(
+        '--once', action='store_true',
+        help='выполнить один цикл опроса, сохранить состояние и выйти'
+    )
+    parser.add_argument(
+        '--state', default=STATE_DB,
+        help='файл базы состояния для режима --once'
+    )
+    return parser.parse_args(argv)
+
+
+def shutdown(bot, state, outbox, deadline=None):
+    """Доотправка уведомлений из outbox и закрытие хранилищ при остановке."""
+    logging.info('Остановка бота: доотправка уведомлений.')
+    deliver_pending(bot, outbox, deadline)
+    state.close()
+    outbox.close()
+    lifecycle.SIGNALS.disarm()
+    logging.info('Бот остановлен.')
+
+
 def main():
     """Основная логика работы бота."""
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    timestamp = {'from_date': int(time.time())}
     check_tokens()
-    previous_answer = ''
-    error_message = ''
-
-    while True:
-        try:
-            response = get_api_answer(timestamp)
-            check_response(response)
-            homework = response.get('homeworks')
-            if homework:
-                answer = parse_status(homework[0])
-                logging.debug(answer)
-                if previous_answer != answer:
-                    send_message(bot, answer)
-                    previous_answer = answer
-                    timestamp['from_date'] = response.get('current_date')
-        except SendMessageError:
-            pass
-        except Exception as error:
-            message = f'Сбой в работе программы: {error}.'
-            logging.error(f'Сбой в работе программы: {error}.', exc_info=True)
-            if message != error_message:
-                try:
-                    send_message(bot, message)
-                    error_message = message
-                except SendMessageError:
-                    pass
-
-        finally:
-            time.sleep(RETRY_PERIOD)
+    bot = telegram.Bot(token=TELEGRAM_TOKEN)
+    bot = RateLimitedBot(bot)
+    state = StateStore()
+    outbox = Outbox()
+    if not outbox.durable:
+        logging.warning(VOLATILE_OUTBOX)
+    metrics.QUEUE_DEPTH.set_function(outbox.pending, queue='outbox')
+    leases = LeaseStore()
+    if not leases.durable:
+        logging.warning(VOLATILE_LEASES)
+    key = lease_key(TELEGRAM_CHAT_ID)
+    keeper = LeaseKeeper(leases, [key]).start()
+    leading = False
+    timestamp = {}
+    statuses = {}
+    scheduler = PollScheduler(RETRY_PERIOD)
+    delay = RETRY_PERIOD
+    errors = ChatErrorDeduplicator(parse_chat_ids(TELEGRAM_CHAT_ID))
+    purge_at = 0.0
+
+    try:
+        while not lifecycle.SIGNALS.stopping:
+            deadline = Deadline()
+            try:
+                if not leases.held(key):
+                    leading = False
+                    logging.debug('Опрос ведёт другой экземпляр бота.')
+                    delay = keeper.interval
+                    continue
+                if not leading:
+                    leading = True
+                    timestamp['from_date'] = state.load_cursor(
+                        TELEGRAM_CHAT_ID, int(time.time())
+                    )
+                    statuses = state.load_statuses(TELEGRAM_CHAT_ID)
+                if time.monotonic() >= purge_at:
+                    outbox.purge()
+                    purge_at = time.monotonic() + OUTBOX_PURGE_INTERVAL
+                with profiling.PROFILER.cycle():
+                    poll_cycle(
+                        bot, state, outbox, timestamp, statuses, deadline,
+                        partial(leases.held, key)
+                    )
+                report_errors(bot, errors)
+                delay = scheduler.success(statuses)
+            except Exception as error:
+                metrics.CYCLE_FAILURES.inc()
+                delay = scheduler.failure(error)
+                logging.error(
+                    f'Сбой в работе программы: {error}.', exc_info=True
+                )
+                report_errors(bot, errors, error)
+
+            finally:
+                if deadline.expired:
+                    metrics.CYCLE_OVERRUNS.inc()
+                    logging.warning(
+                        'Цикл опроса не уложился в бюджет времени.'
+                    )
+                if lifecycle.SIGNALS.installed:
+                    lifecycle.SIGNALS.wait(delay)
+                else:
+                    time.sleep(delay)
+
+        shutdown(bot, state, outbox, lifecycle.SIGNALS.deadline)
+    finally:
+        keeper.stop()
+        leases.close()
 
 
 if __name__ == '__main__':
+    args = parse_args()
     logging.basicConfig(
         level=logging.DEBUG,
-        handlers=[
-            logging.FileHandler('program.log'),
-            logging.StreamHandler(stream=sys.stdout)
-        ],
+        handlers=[logsetup.start_queue_logging()],
         format='%(asctime)s, %(levelname)s, %(message)s',
-        encoding='utf-8'
     )
+    profiling.PROFILER.install_signal()
+    if args.once:
+        sys.exit(run_once(args.state))
+    metrics.start_http_server()
+    lifecycle.SIGNALS.install()
 
     main()
@@ -0,0 +1,44 @@
+"""Отложенный импорт тяжёлых зависимостей."""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Модуль name, который выполнится при первом обращении к атрибуту.
+
+    Уже импортированный модуль возвращается как есть. Иначе в sys.modules
+    кладётся заготовка модуля, поэтому обычный import в другом месте
+    вернёт тот же объект, а разовые запуски, которым модуль не нужен,
+    не тратят время на его загрузку.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyObject:
+    """Объект, который создаётся вызовом factory при первом обращении.
+
+    Нужен там, где объект может и не понадобиться, а его создание тянет
+    тяжёлый импорт: например, бот телеграмма в разовом запуске, которому
+    нечего отправлять.
+    """
+
+    def __init__(self, factory):
+        """Функция без аргументов, создающая объект."""
+        self._factory = factory
+        self._instance = None
+
+    def __getattr__(self, name):
+        if self._instance is None:
+            self._instance = self._factory()
+        return getattr(self._instance, name)
@@ -0,0 +1,193 @@
+"""Аренда пользователей: каждого опрашивает только один экземпляр бота."""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from storage import STATE_DB
+
+LEASE_TTL = float(os.getenv('LEASE_TTL', 30))
+LEASE_RENEW_INTERVAL = float(os.getenv('LEASE_RENEW_INTERVAL', LEASE_TTL / 3))
+VOLATILE_LEASES = (
+    'Аренда хранится в памяти (STATE_DB=:memory:): другие экземпляры её '
+    'не видят, и пользователей могут опрашивать несколько экземпляров.'
+)
+
+LEASE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS leases (
+    tenant TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+'''
+
+
+def lease_key(chat_id):
+    """Ключ аренды по чатам пользователя: «2, 1» и «1,2» совпадают.
+
+    Общий для homework.py и engine.py, чтобы один чат не опрашивали
+    одновременно бот для одного пользователя и движок для многих.
+    """
+    chats = {chat.strip() for chat in str(chat_id).split(',')}
+    return ','.join(sorted(chat for chat in chats if chat))
+
+
+def default_owner():
+    """Имя экземпляра: хост, pid и случайный суффикс."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def owner_is_dead(owner):
+    """Завершился ли владелец аренды, запущенный на этом же хосте."""
+    host, _, rest = owner.partition(':')
+    pid = rest.partition(':')[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class LeaseStore:
+    """Аренда пользователей экземплярами бота в общей базе SQLite.
+
+    Экземпляр опрашивает пользователя, только пока держит его аренду, и
+    продлевает её каждые LEASE_RENEW_INTERVAL секунд. Аренда, которую не
+    продлили ttl секунд, достаётся другому экземпляру; если владелец
+    завершился на этом же хосте, она перехватывается сразу. Аренда
+    считается своей до момента, отсчитанного от начала попытки продления,
+    поэтому экземпляр перестаёт опрашивать раньше, чем её может получить
+    другой.
+    """
+
+    def __init__(self, path=STATE_DB, owner=None, ttl=LEASE_TTL,
+                 clock=time.time):
+        """Открытие базы, имя экземпляра и время жизни аренды."""
+        self.path = path
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.clock = clock
+        self._expires = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(LEASE_SCHEMA)
+
+    @property
+    def durable(self):
+        """Видна ли аренда другим процессам: база хранится в файле."""
+        return self.path != ':memory:'
+
+    def _take(self, tenant, now):
+        cursor = self._connection.execute(
+            'INSERT INTO leases (tenant, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (tenant) DO UPDATE SET '
+            'owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE leases.owner = excluded.owner OR leases.expires_at < ?',
+            (tenant, self.owner, now + self.ttl, now)
+        )
+        if cursor.rowcount == 1:
+            return True
+        holder = self._connection.execute(
+            'SELECT owner FROM leases WHERE tenant = ?', (tenant,)
+        ).fetchone()[0]
+        if not owner_is_dead(holder):
+            return False
+        logging.warning(f'{tenant}: аренда {holder} перехвачена.')
+        return self._connection.execute(
+            'UPDATE leases SET owner = ?, expires_at = ? '
+            'WHERE tenant = ? AND owner = ?',
+            (self.owner, now + self.ttl, tenant, holder)
+        ).rowcount == 1
+
+    def acquire(self, tenants):
+        """Получение или продление аренды; множество удержанных."""
+        tenants = [str(tenant) for tenant in tenants]
+        now = self.clock()
+        with self._lock, self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            held = {tenant for tenant in tenants if self._take(tenant, now)}
+        for tenant in tenants:
+            if tenant in held:
+                self._expires[tenant] = now + self.ttl
+            else:
+                self._expires.pop(tenant, None)
+        return held
+
+    def held(self, tenant):
+        """Держит ли экземпляр аренду пользователя сейчас."""
+        return self._expires.get(str(tenant), 0) > self.clock()
+
+    def holder(self, tenant):
+        """Текущий владелец аренды или None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT owner FROM leases '
+                'WHERE tenant = ? AND expires_at >= ?',
+                (str(tenant), self.clock())
+            ).fetchone()
+        return row[0] if row else None
+
+    def release(self, tenants):
+        """Освобождение аренды, чтобы её сразу получил другой экземпляр."""
+        tenants = [str(tenant) for tenant in tenants]
+        for tenant in tenants:
+            self._expires.pop(tenant, None)
+        with self._lock:
+            self._connection.executemany(
+                'DELETE FROM leases WHERE tenant = ? AND owner = ?',
+                [(tenant, self.owner) for tenant in tenants]
+            )
+
+    def close(self):
+        """Закрытие соединения с базой."""
+        with self._lock:
+            self._connection.close()
+
+
+class LeaseKeeper:
+    """Фоновый поток, продлевающий аренду пользователей tenants."""
+
+    def __init__(self, leases, tenants, interval=LEASE_RENEW_INTERVAL):
+        """Хранилище аренды, пользователи и период продления."""
+        self.leases = leases
+        self.tenants = list(tenants)
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='lease', daemon=True
+        )
+
+    def renew(self):
+        """Одна попытка получить или продлить аренду."""
+        try:
+            return self.leases.acquire(self.tenants)
+        except sqlite3.Error as error:
+            logging.error(f'Аренда не продлена: {error}.')
+            return set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.renew()
+
+    def start(self):
+        """Первая попытка получить аренду и запуск продления."""
+        self.renew()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка продления и освобождение аренды."""
+        self._stopped.set()
+        self._thread.join()
+        self.leases.release(self.tenants)
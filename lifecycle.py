@@ -0,0 +1,104 @@
+"""Управление работающим ботом сигналами: немедленный опрос и остановка."""
+import logging
+import os
+import select
+import signal
+import socket
+import time
+
+from scheduler import Deadline
+
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', 10))
+POLL_SIGNAL = getattr(signal, 'SIGUSR1', None)
+STOP_SIGNAL = signal.SIGTERM
+
+
+class Signals:
+    """Сигналы управления циклом опроса в главном потоке.
+
+    SIGUSR1 прерывает паузу между циклами, и следующий опрос начинается
+    сразу. SIGTERM тоже прерывает паузу и выставляет stopping: цикл
+    завершается, недоставленные сообщения доотправляются, и бот выходит.
+    Если остановка занимает больше shutdown_timeout секунд, SIGALRM
+    прерывает её исключением SystemExit.
+
+    Пауза ждёт на сокете, в который signal.set_wakeup_fd записывает номер
+    каждого сигнала, поэтому сигнал, пришедший во время цикла, прерывает
+    следующую паузу, а не теряется.
+    """
+
+    def __init__(self, shutdown_timeout=SHUTDOWN_TIMEOUT):
+        """Время на доотправку сообщений при остановке."""
+        self.shutdown_timeout = shutdown_timeout
+        self.installed = False
+        self.stopping = False
+        self.deadline = None
+        self._reader = self._writer = None
+        self._previous = {}
+
+    def install(self):
+        """Установка обработчиков; вызывается из главного потока."""
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        self._previous['wakeup_fd'] = signal.set_wakeup_fd(
+            self._writer.fileno(), warn_on_full_buffer=False
+        )
+        if POLL_SIGNAL is not None:
+            self._previous[POLL_SIGNAL] = signal.signal(
+                POLL_SIGNAL, lambda *args: None
+            )
+        self._previous[STOP_SIGNAL] = signal.signal(
+            STOP_SIGNAL, self._on_stop
+        )
+        self.installed = True
+
+    def close(self):
+        """Возврат прежних обработчиков сигналов."""
+        if not self.installed:
+            return
+        self.disarm()
+        signal.set_wakeup_fd(self._previous.pop('wakeup_fd'))
+        for signum, handler in self._previous.items():
+            signal.signal(signum, handler)
+        self._previous.clear()
+        self._reader.close()
+        self._writer.close()
+        self.installed = False
+        self.stopping = False
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+        self.deadline = Deadline(self.shutdown_timeout)
+        if hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGALRM, self._on_timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.shutdown_timeout)
+
+    def _on_timeout(self, signum, frame):
+        raise SystemExit('Остановка не уложилась в SHUTDOWN_TIMEOUT.')
+
+    def disarm(self):
+        """Отмена принудительного выхода после завершённой остановки."""
+        if self.stopping and hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def _received(self):
+        try:
+            return set(self._reader.recv(4096))
+        except BlockingIOError:
+            return set()
+
+    def wait(self, seconds):
+        """Пауза до seconds секунд, которую прерывают SIGUSR1 и SIGTERM."""
+        expires_at = time.monotonic() + seconds
+        while not self.stopping:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self._reader], [], [], remaining)
+            if readable and POLL_SIGNAL in self._received():
+                logging.info('Получен сигнал на немедленный опрос.')
+                return
+
+
+SIGNALS = Signals()
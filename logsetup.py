@@ -0,0 +1,93 @@
+"""Неблокирующее логирование через очередь с ротацией файла."""
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import (QueueHandler, QueueListener,
+                              RotatingFileHandler, TimedRotatingFileHandler)
+
+LOG_FILE = os.getenv('LOG_FILE', 'program.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', '')
+
+
+def parse_rates(spec):
+    """Доли записей по уровням из строки вида «DEBUG=0.1,INFO=0.5»."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, rate = item.partition('=')
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f'Неизвестный уровень логирования: {name}')
+        rates[level] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Пропуск только доли rates[level] записей каждого уровня.
+
+    Уровни, которых нет в rates, пропускаются полностью.
+    """
+
+    def __init__(self, rates, rng=random):
+        """Доли записей по числовым уровням логирования."""
+        super().__init__()
+        self.rates = dict(rates)
+        self._rng = rng
+
+    def filter(self, record):
+        """Решение о записи: True, если запись попала в выборку."""
+        rate = self.rates.get(record.levelno)
+        return rate is None or self._rng.random() < rate
+
+
+def file_handler(path=LOG_FILE, max_bytes=LOG_MAX_BYTES,
+                 backup_count=LOG_BACKUP_COUNT, when=LOG_ROTATE_WHEN):
+    """Файловый обработчик с ротацией по времени или по размеру."""
+    if when:
+        return TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    return RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+
+
+def start_queue_logging(handlers=None, sample=LOG_SAMPLE):
+    """Обработчик, кладущий записи в очередь, и запущенный слушатель.
+
+    Запись на диск и в stdout выполняет отдельный поток QueueListener,
+    поэтому вызовы логирования в цикле опроса не ждут ввода-вывода.
+    Записи, не попавшие в выборку по LOG_SAMPLE, отбрасываются ещё до
+    очереди. Слушатель доступен как атрибут listener обработчика и
+    останавливается stop_queue_logging при выходе из программы.
+    """
+    if handlers is None:
+        handlers = [file_handler(), logging.StreamHandler(stream=sys.stdout)]
+    records = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    rates = parse_rates(sample)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    handler.listener = QueueListener(
+        records, *handlers, respect_handler_level=True
+    )
+    handler.listener.start()
+    handler.listening = True
+    atexit.register(stop_queue_logging, handler)
+    return handler
+
+
+def stop_queue_logging(handler):
+    """Запись оставшихся в очереди записей и остановка слушателя.
+
+    Повторный вызов, например из atexit после явной остановки, ничего не
+    делает.
+    """
+    if handler.listening:
+        handler.listening = False
+        handler.listener.stop()
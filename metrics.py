@@ -0,0 +1,337 @@
+"""Метрики бота в текстовом формате Prometheus."""
+import contextlib
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+
+from exeptions import (CircuitOpenError, DeadlineExceededError, GetAPIError,
+                       PartialDeliveryError, ResponseSchemaError,
+                       SendMessageError, TooManyRequestsError)
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+KNOWN_ERRORS = (
+    CircuitOpenError, TooManyRequestsError, GetAPIError,
+    ResponseSchemaError, PartialDeliveryError, DeadlineExceededError,
+    SendMessageError, TimeoutError, ConnectionError,
+)
+STAGE_OBSERVERS = []
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, _escape(value))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """Базовая метрика с необязательными метками."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        """Имя, описание и имена меток метрики."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        """Удаление значения с указанными метками."""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self):
+        """Строки значений метрики."""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            yield f'{self.name}{_labels(self.labelnames, key)} {value}'
+
+    def render(self):
+        """Метрика в текстовом формате Prometheus."""
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Увеличение счётчика."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Текущее значение счётчика."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и уменьшаться."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        """Gauge без значений; значения задаются set или set_function."""
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        """Установка значения."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function, **labels):
+        """Значение, вычисляемое при каждом чтении метрики."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def remove(self, **labels):
+        """Удаление значения или функции с указанными метками."""
+        super().remove(**labels)
+        with self._lock:
+            self._functions.pop(self._key(labels), None)
+
+    def samples(self):
+        """Строки значений, включая вычисляемые."""
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = function()
+            except Exception:
+                logging.exception(f'Не удалось вычислить {self.name}.')
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {value}'
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        """Гистограмма с верхними границами корзин buckets."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Учёт одного значения."""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        """Число учтённых значений."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self):
+        """Строки корзин, суммы и числа значений."""
+        with self._lock:
+            values = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            ]
+        names = self.labelnames + ('le',)
+        for key, counts, total, count in sorted(values):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _labels(names, key + (bound,))
+                yield f'{self.name}_bucket{labels} {bucket_count}'
+            labels = _labels(names, key + ('+Inf',))
+            yield f'{self.name}_bucket{labels} {count}'
+            labels = _labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Registry:
+    """Набор метрик, отдаваемых по /metrics."""
+
+    def __init__(self):
+        """Пустой набор метрик."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Добавление метрики; повторная регистрация имени запрещена."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Метрика {metric.name} уже существует.')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'homework_bot_stage_seconds',
+    'Длительность этапов цикла опроса.',
+    ('stage',)
+))
+ERRORS = REGISTRY.register(Counter(
+    'homework_bot_errors_total',
+    'Исключения в этапах цикла опроса по типам.',
+    ('stage', 'type')
+))
+CYCLE_FAILURES = REGISTRY.register(Counter(
+    'homework_bot_cycle_failures_total',
+    'Циклы опроса, завершившиеся ошибкой.',
+))
+CYCLE_OVERRUNS = REGISTRY.register(Counter(
+    'homework_bot_cycle_overruns_total',
+    'Циклы опроса, не уложившиеся в CYCLE_BUDGET.',
+))
+COALESCED_REQUESTS = REGISTRY.register(Counter(
+    'homework_bot_coalesced_requests_total',
+    'Запросы к API, объединённые с уже выполняющимся запросом.',
+))
+LAST_SUCCESSFUL_POLL = REGISTRY.register(Gauge(
+    'homework_bot_last_successful_poll_timestamp_seconds',
+    'Время последнего успешного опроса API.',
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'homework_bot_circuit_state',
+    'Состояние выключателя API: 0 closed, 1 half_open, 2 open.',
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'homework_bot_queue_depth',
+    'Число сообщений, ожидающих отправки.',
+    ('queue',)
+))
+SEND_QUEUE_REJECTED = REGISTRY.register(Counter(
+    'homework_bot_send_queue_rejected_total',
+    'Сообщения, не поместившиеся в заполненную очередь отправки.',
+))
+SEND_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'homework_bot_send_queue_wait_seconds',
+    'Время ожидания сообщения в очереди отправки.',
+))
+SEND_QUEUE_MAX_DEPTH = REGISTRY.register(Gauge(
+    'homework_bot_send_queue_max_depth',
+    'Наибольшая длина очереди отправки с запуска процесса.',
+))
+SEND_FAILURES = REGISTRY.register(Counter(
+    'homework_bot_send_failures_total',
+    'Сообщения из очереди, отправить которые не удалось.',
+))
+SHARD_UP = REGISTRY.register(Gauge(
+    'homework_bot_shard_up',
+    'Процесс шарда жив и присылает heartbeat: 1 или 0.',
+    ('shard',)
+))
+SHARD_TENANTS = REGISTRY.register(Gauge(
+    'homework_bot_shard_tenants',
+    'Число пользователей, закреплённых за шардом.',
+    ('shard',)
+))
+SHARD_RESTARTS = REGISTRY.register(Counter(
+    'homework_bot_shard_restarts_total',
+    'Перезапуски упавших или зависших процессов шардов.',
+    ('shard',)
+))
+
+
+def error_type(error):
+    """Тип ошибки для метки: известное исключение или unexpected.
+
+    Кроме исключений бота различаются таймауты и ошибки соединения, в том
+    числе из requests, если он уже загружен.
+    """
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        if isinstance(error, requests.Timeout):
+            return 'TimeoutError'
+        if isinstance(error, requests.ConnectionError):
+            return 'ConnectionError'
+    for known in KNOWN_ERRORS:
+        if isinstance(error, known):
+            return known.__name__
+    return 'unexpected'
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Время выполнения и исключения блока как этапа name.
+
+    Кроме гистограммы STAGE_SECONDS длительность передаётся функциям из
+    STAGE_OBSERVERS, например профилировщику.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as error:
+        ERRORS.inc(stage=name, type=error_type(error))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        for observer in STAGE_OBSERVERS:
+            observer(name, elapsed)
+
+
+def timed(name):
+    """Декоратор: время выполнения и исключения функции как этапа name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Запуск сервера метрик в фоновом потоке; порт 0 отключает сервер."""
+    if not port:
+        return None
+    import metrics_http
+    return metrics_http.serve(REGISTRY, host, port)
@@ -0,0 +1,36 @@
+"""HTTP-сервер метрик; импортируется, только если задан METRICS_PORT."""
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Отдача метрик реестра сервера по GET /metrics."""
+
+    def do_GET(self):
+        """Ответ на GET-запрос."""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Запросы к /metrics не пишутся в лог."""
+
+
+def serve(registry, host, port):
+    """Запуск сервера метрик registry в фоновом потоке."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.registry = registry
+    thread = threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True
+    )
+    thread.start()
+    logging.info(f'Метрики доступны на http://{host}:{port}/metrics.')
+    return server
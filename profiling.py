@@ -0,0 +1,216 @@
+"""Профилирование этапов цикла опроса по запросу, без перезапуска."""
+import contextlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+import metrics
+from lazy import lazy_import
+
+cProfile = lazy_import('cProfile')
+pstats = lazy_import('pstats')
+tracemalloc = lazy_import('tracemalloc')
+
+PROFILE_CYCLES = int(os.getenv('PROFILE_CYCLES', 0))
+PROFILE_SIGNAL_CYCLES = int(os.getenv('PROFILE_SIGNAL_CYCLES', 10))
+PROFILE_TOOLS = os.getenv('PROFILE_TOOLS', 'cprofile,tracemalloc')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_TOP = 25
+TOOLS = ('cprofile', 'tracemalloc')
+
+
+class Profiler:
+    """Съём профиля за несколько циклов опроса.
+
+    После request(cycles) следующие cycles циклов записываются: время
+    каждого этапа из metrics.stage и длительность циклов, а также, в
+    зависимости от tools, профиль cProfile и распределение памяти
+    tracemalloc. Циклы могут идти одновременно: съём начинается с первым
+    из них и заканчивается, когда завершится последний из cycles
+    записываемых. Затем отчёт пишется в directory и запись выключается,
+    поэтому вне съёма профиля накладных расходов нет.
+
+    cProfile видит только поток, в котором начат съём. Работа в пулах
+    потоков попадает в профиль, если её запускать через call(): профили
+    таких вызовов объединяются с основным в одном файле .pstats.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, tools=PROFILE_TOOLS):
+        """Каталог отчётов и инструменты через запятую."""
+        self.directory = directory
+        self.tools = {tool.strip() for tool in tools.split(',') if tool}
+        unknown = self.tools - set(TOOLS)
+        if unknown:
+            raise ValueError(f'Неизвестные инструменты: {sorted(unknown)}')
+        self._requested = 0
+        self._remaining = 0
+        self._running = 0
+        self._capturing = False
+        self._lock = threading.RLock()
+        self._stages = {}
+        self._cycles = []
+        self._profile = None
+        self._owner = None
+        self._calls = []
+        self._tracing = False
+        self._dumps = 0
+
+    @property
+    def active(self):
+        """Идёт ли съём профиля."""
+        return self._capturing
+
+    def request(self, cycles=None):
+        """Съём профиля за cycles следующих циклов.
+
+        Только запоминает запрос, поэтому безопасна в обработчике сигнала.
+        """
+        self._requested = cycles or PROFILE_SIGNAL_CYCLES
+
+    def install_signal(self, signum=getattr(signal, 'SIGUSR2', None)):
+        """Запрос профиля по сигналу (по умолчанию SIGUSR2)."""
+        if signum is None:
+            return
+        signal.signal(signum, lambda *args: self.request())
+
+    def _observe(self, stage, seconds):
+        with self._lock:
+            count, total, longest = self._stages.get(stage, (0, 0.0, 0.0))
+            self._stages[stage] = (
+                count + 1, total + seconds, max(longest, seconds)
+            )
+
+    def _start(self):
+        self._remaining, self._requested = self._requested, 0
+        self._capturing = True
+        self._stages = {}
+        self._cycles = []
+        self._calls = []
+        metrics.STAGE_OBSERVERS.append(self._observe)
+        if 'tracemalloc' in self.tools and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if 'cprofile' in self.tools:
+            self._profile = cProfile.Profile()
+            self._owner = threading.get_ident()
+            self._profile.enable()
+
+    def _stop(self):
+        self._capturing = False
+        metrics.STAGE_OBSERVERS.remove(self._observe)
+        if self._profile is not None:
+            self._profile.disable()
+        snapshot = None
+        if self._tracing:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self._tracing = False
+        path = self.dump(snapshot)
+        self._profile = None
+        self._owner = None
+        self._calls = []
+        logging.info(f'Профиль циклов опроса записан в {path}.*')
+        return path
+
+    @contextlib.contextmanager
+    def cycle(self):
+        """Границы одного цикла опроса для съёма профиля."""
+        if not self._requested and not self._capturing:
+            yield
+            return
+        with self._lock:
+            if self._requested and not self._capturing:
+                self._start()
+            recorded = self._capturing and self._remaining > 0
+            if recorded:
+                self._remaining -= 1
+                self._running += 1
+        if not recorded:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._cycles.append(time.perf_counter() - started)
+                self._running -= 1
+                if not self._remaining and not self._running:
+                    self._stop()
+
+    def call(self, func, *args):
+        """Вызов func(*args) с профилем cProfile в текущем потоке.
+
+        Для работы в пулах потоков: во время съёма её профиль добавляется
+        к профилю циклов, в остальное время func просто вызывается.
+        """
+        if (self._profile is None
+                or self._owner == threading.get_ident()):
+            return func(*args)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                if self._profile is not None:
+                    self._calls.append(profile)
+
+    def report(self):
+        """Сводка по этапам и циклам текущего или последнего съёма."""
+        with self._lock:
+            stages = dict(self._stages)
+            cycles = list(self._cycles)
+            calls = len(self._calls)
+        return {
+            'cycles': len(cycles),
+            'cycle_seconds': cycles,
+            'profiled_calls': calls,
+            'stages': {
+                stage: {
+                    'count': count,
+                    'total': total,
+                    'mean': total / count,
+                    'max': longest,
+                }
+                for stage, (count, total, longest) in sorted(stages.items())
+            },
+        }
+
+    def dump(self, snapshot=None):
+        """Запись отчёта в directory; возвращает путь без расширения."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._dumps += 1
+        path = os.path.join(
+            self.directory,
+            time.strftime('profile-%Y%m%d-%H%M%S')
+            + f'-{os.getpid()}-{self._dumps}'
+        )
+        with open(path + '.json', 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+        if self._profile is not None:
+            self._merged_stats().dump_stats(path + '.pstats')
+        if snapshot is not None:
+            with open(path + '.tracemalloc.txt', 'w',
+                      encoding='utf-8') as file:
+                for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                    file.write(f'{stat}\n')
+        return path
+
+    def _merged_stats(self):
+        """Основной профиль вместе с профилями вызовов call()."""
+        stats = pstats.Stats()
+        for profile in [self._profile, *self._calls]:
+            profile.create_stats()
+            if profile.stats:
+                stats.add(profile)
+        return stats
+
+
+PROFILER = Profiler()
+if PROFILE_CYCLES:
+    PROFILER.request(PROFILE_CYCLES)
@@ -0,0 +1,175 @@
+"""Ограничение частоты отправки сообщений в телеграмм."""
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from exeptions import DeadlineExceededError
+from lazy import lazy_import
+
+telegram = lazy_import('telegram')
+
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_RETRIES = int(os.getenv('TELEGRAM_RETRIES', 3))
+SEND_DEADLINE = contextvars.ContextVar('send_deadline', default=None)
+
+
+@contextlib.contextmanager
+def send_deadline(deadline):
+    """Бюджет времени deadline для всех отправок внутри блока."""
+    token = SEND_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        SEND_DEADLINE.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        """Корзина изначально заполнена."""
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Резерв одного токена; возвращает время ожидания до него."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def set_rate(self, rate):
+        """Новая скорость; ёмкость корзины меняется вместе с ней."""
+        with self._lock:
+            now = self._clock()
+            self._tokens += (now - self._updated) * self.rate
+            self._updated = now
+            self.rate = rate
+            self.capacity = max(rate, 1)
+            self._tokens = min(self.capacity, self._tokens)
+
+    def refund(self):
+        """Возврат неиспользованного токена."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class RateLimiter:
+    """Общий лимит бота и отдельные лимиты для каждого чата.
+
+    Помимо корзин поддерживается общая пауза, которую задаёт ответ
+    телеграмма 429 (RetryAfter).
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE,
+                 chat_rate=TELEGRAM_CHAT_RATE, sleep=time.sleep,
+                 clock=time.monotonic):
+        """Лимиты в сообщениях в секунду."""
+        self.chat_rate = chat_rate
+        self._global = TokenBucket(global_rate, clock=clock)
+        self._chats = {}
+        self._paused_until = 0.0
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(
+                    self.chat_rate, clock=self._clock
+                )
+            return bucket
+
+    @property
+    def global_rate(self):
+        """Общий лимит бота в сообщениях в секунду."""
+        return self._global.rate
+
+    def set_global_rate(self, rate):
+        """Изменение общего лимита без сброса накопленных токенов."""
+        if rate != self._global.rate:
+            self._global.set_rate(rate)
+
+    def pause(self, seconds):
+        """Остановка всех отправок на seconds секунд."""
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, self._clock() + seconds
+            )
+
+    def wait(self, chat_id, deadline=None):
+        """Ожидание разрешения на отправку в чат; возвращает паузу.
+
+        Если пауза длиннее остатка бюджета deadline, токены возвращаются
+        и выбрасывается DeadlineExceededError вместо ожидания.
+        """
+        with self._lock:
+            paused = max(0.0, self._paused_until - self._clock())
+        chat = self._chat_bucket(chat_id)
+        delay = max(paused, self._global.reserve(), chat.reserve())
+        if deadline is not None and delay > deadline.remaining():
+            self._global.refund()
+            chat.refund()
+            raise DeadlineExceededError(
+                f'Ожидание лимита отправки {delay:.1f} с дольше бюджета.'
+            )
+        if delay:
+            self._sleep(delay)
+        return delay
+
+
+class RateLimitedBot:
+    """Обёртка над telegram.Bot, соблюдающая лимиты отправки.
+
+    На ответ RetryAfter обёртка приостанавливает все отправки на
+    указанное телеграммом время и повторяет сообщение, а не завершается
+    ошибкой. После retries неудачных попыток исключение пробрасывается.
+    Внутри send_deadline паузы, не укладывающиеся в бюджет, не
+    выжидаются: отправка завершается DeadlineExceededError.
+    """
+
+    def __init__(self, bot, limiter=None, retries=TELEGRAM_RETRIES):
+        """Бот и общий для всех отправок ограничитель."""
+        self.bot = bot
+        self.limiter = limiter or RateLimiter()
+        self.retries = retries
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Отправка сообщения с учётом лимитов."""
+        deadline = SEND_DEADLINE.get()
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(chat_id, deadline)
+            try:
+                return self.bot.send_message(chat_id, text, **kwargs)
+            except telegram.error.RetryAfter as error:
+                if attempt == self.retries:
+                    raise
+                logging.warning(
+                    f'Телеграмм просит подождать {error.retry_after} с.'
+                )
+                self.limiter.pause(error.retry_after)
+                if (deadline is not None
+                        and error.retry_after > deadline.remaining()):
+                    raise DeadlineExceededError(
+                        f'Пауза {error.retry_after} с дольше бюджета.'
+                    )
+
+    def __getattr__(self, name):
+        return getattr(self.bot, name)
@@ -0,0 +1,72 @@
+"""Выбор паузы до следующего запроса к API и бюджет времени цикла."""
+import os
+import random
+import time
+
+POLL_MIN_PERIOD = int(os.getenv('POLL_MIN_PERIOD', 60))
+POLL_MAX_PERIOD = int(os.getenv('POLL_MAX_PERIOD', 3600))
+REVIEW_PERIOD = int(os.getenv('REVIEW_PERIOD', 120))
+CYCLE_BUDGET = float(os.getenv('CYCLE_BUDGET', 60))
+FAST_STATUSES = ('reviewing',)
+
+
+class PollScheduler:
+    """Адаптивный период опроса.
+
+    Пока работа на проверке, API опрашивается чаще (REVIEW_PERIOD), в
+    остальное время раз в period. После ошибок пауза растёт
+    экспоненциально от period со случайным разбросом (после первой ошибки
+    от period до 2 * period), чтобы сбоящий API не опрашивался чаще
+    работающего, а ответ 429 с Retry-After задаёт нижнюю границу паузы.
+    Все паузы ограничены min_period и max_period.
+    """
+
+    def __init__(self, period, review_period=REVIEW_PERIOD,
+                 min_period=POLL_MIN_PERIOD, max_period=POLL_MAX_PERIOD,
+                 rng=random):
+        """Базовый период и границы пауз в секундах."""
+        self.period = period
+        self.review_period = review_period
+        self.min_period = min_period
+        self.max_period = max_period
+        self.failures = 0
+        self._rng = rng
+
+    def _clamp(self, delay):
+        return max(self.min_period, min(self.max_period, delay))
+
+    def success(self, statuses):
+        """Пауза после успешного цикла с учётом статусов работ."""
+        self.failures = 0
+        if any(status in FAST_STATUSES for status in statuses.values()):
+            return self._clamp(self.review_period)
+        return self._clamp(self.period)
+
+    def failure(self, error=None):
+        """Пауза после неудачного цикла: экспоненциальная, с разбросом."""
+        self.failures += 1
+        ceiling = min(self.max_period, self.period * 2 ** self.failures)
+        delay = ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return self._clamp(delay)
+
+
+class Deadline:
+    """Общий бюджет времени на цикл опроса: запрос, разбор и отправку."""
+
+    def __init__(self, budget=CYCLE_BUDGET, clock=time.monotonic):
+        """Бюджет в секундах, отсчитываемый с момента создания."""
+        self.budget = budget
+        self._clock = clock
+        self._expires_at = clock() + budget
+
+    def remaining(self):
+        """Оставшееся время в секундах, не меньше нуля."""
+        return max(0.0, self._expires_at - self._clock())
+
+    @property
+    def expired(self):
+        """Бюджет исчерпан."""
+        return self.remaining() <= 0
@@ -0,0 +1,93 @@
+"""Декларативная схема ответа API и её быстрая проверка."""
+from collections import namedtuple
+
+Field = namedtuple(
+    'Field', ('type', 'choices', 'required'), defaults=(None, True)
+)
+Defect = namedtuple('Defect', ('index', 'field', 'problem'))
+
+_MISSING = object()
+
+
+class Validator:
+    """Проверка записей по схеме, собранная один раз при создании.
+
+    Схема раскладывается в кортеж проверок, а корректные записи проходят
+    через быстрый путь без сбора описаний ошибок. Для некорректных
+    возвращаются все нарушения сразу, а не первое.
+    """
+
+    def __init__(self, fields):
+        """Схема: словарь имя поля -> Field."""
+        self.fields = dict(fields)
+        self._checks = tuple(
+            (name, field.type, frozenset(field.choices)
+             if field.choices is not None else None, field.required)
+            for name, field in self.fields.items()
+        )
+
+    def _fast(self, record):
+        if type(record) is not dict:
+            return False
+        for name, kind, choices, required in self._checks:
+            value = record.get(name, _MISSING)
+            if value is _MISSING:
+                if required:
+                    return False
+                continue
+            if not isinstance(value, kind):
+                return False
+            if choices is not None and value not in choices:
+                return False
+        return True
+
+    def __call__(self, record, index=None):
+        """Список нарушений схемы в записи; пустой для корректной."""
+        if self._fast(record):
+            return []
+        if not isinstance(record, dict):
+            return [Defect(index, None, 'запись не является словарём')]
+        defects = []
+        for name, kind, choices, required in self._checks:
+            value = record.get(name, _MISSING)
+            if value is _MISSING:
+                if required:
+                    defects.append(Defect(index, name, 'нет ключа'))
+            elif not isinstance(value, kind):
+                defects.append(Defect(
+                    index, name, f'ожидался {kind.__name__}, '
+                    f'получен {type(value).__name__}'
+                ))
+            elif choices is not None and value not in choices:
+                defects.append(Defect(
+                    index, name, f'недопустимое значение {value!r}'
+                ))
+        return defects
+
+    def filter(self, records, defects):
+        """Корректные записи по одной; нарушения добавляются в defects."""
+        for index, record in enumerate(records):
+            if self._fast(record):
+                yield record
+            else:
+                defects.extend(self(record, index))
+
+    def validate_many(self, records):
+        """Проверка списка за один проход: (корректные, нарушения)."""
+        defects = []
+        return list(self.filter(records, defects)), defects
+
+
+def compile_schema(fields):
+    """Сборка Validator по декларативной схеме."""
+    return Validator(fields)
+
+
+def describe(defects):
+    """Текстовое описание всех нарушений."""
+    return '; '.join(
+        (f'работа №{defect.index}: ' if defect.index is not None else '')
+        + (f'{defect.field}: ' if defect.field else '')
+        + defect.problem
+        for defect in defects
+    )
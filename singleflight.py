@@ -0,0 +1,40 @@
+"""Объединение одновременных одинаковых запросов к API."""
+import asyncio
+from functools import partial
+
+import metrics
+
+
+class SingleFlight:
+    """Один запрос на ключ для всех, кто ждёт его одновременно.
+
+    Первый вызов do() с данным ключом запускает корутину, остальные до её
+    завершения получают тот же результат или то же исключение. После
+    завершения ключ освобождается, и следующий вызов снова идёт к API.
+    Отмена одного из ожидающих не отменяет общий запрос.
+    """
+
+    def __init__(self):
+        """Пустой набор выполняющихся запросов."""
+        self._calls = {}
+
+    def __len__(self):
+        """Число выполняющихся запросов."""
+        return len(self._calls)
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key, func, *args):
+        """Результат корутины func(*args), общий для ключа key."""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self._calls[key] = future
+            future.add_done_callback(partial(self._forget, key))
+        else:
+            metrics.COALESCED_REQUESTS.inc()
+        return await asyncio.shield(future)
@@ -0,0 +1,223 @@
+"""Хранение курсора from_date, статусов работ и исходящих сообщений."""
+import os
+import sqlite3
+import threading
+import time
+
+STATE_DB = os.getenv('STATE_DB', 'homework.sqlite3')
+VOLATILE_OUTBOX = (
+    'Outbox хранится в памяти (STATE_DB=:memory:): недоставленные '
+    'уведомления потеряются при перезапуске.'
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cursors (
+    tenant TEXT PRIMARY KEY,
+    from_date INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS statuses (
+    tenant TEXT NOT NULL,
+    homework TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (tenant, homework)
+);
+'''
+
+
+class StateStore:
+    """Состояние опроса, переживающее перезапуск бота.
+
+    База хранится в файле STATE_DB (по умолчанию homework.sqlite3);
+    значение ':memory:' держит состояние только в памяти процесса.
+    """
+
+    def __init__(self, path=STATE_DB):
+        """Открытие базы и создание таблиц."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+
+    def load_cursor(self, tenant, default):
+        """Сохранённое значение from_date или default."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT from_date FROM cursors WHERE tenant = ?', (tenant,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def load_statuses(self, tenant):
+        """Словарь последних известных статусов работ пользователя."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT homework, status FROM statuses WHERE tenant = ?',
+                (tenant,)
+            ).fetchall()
+        return dict(rows)
+
+    def save(self, tenant, from_date, statuses):
+        """Атомарная запись курсора и статусов пользователя."""
+        with self._lock, self._connection:
+            self._connection.execute('BEGIN')
+            self._connection.execute(
+                'INSERT INTO cursors (tenant, from_date) VALUES (?, ?) '
+                'ON CONFLICT (tenant) '
+                'DO UPDATE SET from_date = excluded.from_date',
+                (tenant, from_date)
+            )
+            self._connection.executemany(
+                'INSERT INTO statuses (tenant, homework, status) '
+                'VALUES (?, ?, ?) ON CONFLICT (tenant, homework) '
+                'DO UPDATE SET status = excluded.status',
+                [(tenant, key, status) for key, status in statuses.items()]
+            )
+
+    def close(self):
+        """Закрытие соединения с базой."""
+        with self._lock:
+            self._connection.close()
+
+
+OUTBOX_BASE_DELAY = int(os.getenv('OUTBOX_BASE_DELAY', 30))
+OUTBOX_MAX_DELAY = int(os.getenv('OUTBOX_MAX_DELAY', 3600))
+OUTBOX_CLAIM_TIMEOUT = int(os.getenv('OUTBOX_CLAIM_TIMEOUT', 300))
+OUTBOX_KEEP_DELIVERED = int(os.getenv('OUTBOX_KEEP_DELIVERED', 7 * 86400))
+OUTBOX_PURGE_INTERVAL = int(os.getenv('OUTBOX_PURGE_INTERVAL', 3600))
+
+OUTBOX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due
+    ON outbox (next_attempt) WHERE delivered_at IS NULL;
+CREATE INDEX IF NOT EXISTS outbox_delivered
+    ON outbox (delivered_at) WHERE delivered_at IS NOT NULL;
+'''
+
+
+class Outbox:
+    """Журнал недоставленных сообщений с повтором отправки.
+
+    Сообщение сначала записывается в базу под ключом идемпотентности, а
+    после доставки помечается отправленным. Повторная запись с тем же
+    ключом игнорируется, поэтому перезапуск не приводит к дублям. Чтобы
+    сообщения не терялись при падении, база должна храниться в файле.
+    """
+
+    def __init__(self, path=STATE_DB, base_delay=OUTBOX_BASE_DELAY,
+                 max_delay=OUTBOX_MAX_DELAY):
+        """Открытие базы и создание таблицы outbox."""
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(OUTBOX_SCHEMA)
+
+    @property
+    def durable(self):
+        """Переживут ли сообщения перезапуск: база хранится в файле."""
+        return self.path != ':memory:'
+
+    def add(self, key, tenant, chat_id, text):
+        """Запись сообщения; False, если ключ уже встречался."""
+        with self._lock:
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO outbox '
+                '(key, tenant, chat_id, text, next_attempt) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, tenant, str(chat_id), text, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def due(self, limit=100, claim_timeout=OUTBOX_CLAIM_TIMEOUT):
+        """Сообщения, которые пора отправить: список (key, chat_id, text).
+
+        Выбранные сообщения откладываются на claim_timeout, чтобы их не
+        взял повторно другой отправитель, пока идёт доставка.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            rows = self._connection.execute(
+                'SELECT key, chat_id, text FROM outbox '
+                'WHERE delivered_at IS NULL AND next_attempt <= ? '
+                'ORDER BY next_attempt LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            self._connection.executemany(
+                'UPDATE outbox SET next_attempt = ? WHERE key = ?',
+                [(now + claim_timeout, row[0]) for row in rows]
+            )
+        return rows
+
+    def done(self, key):
+        """Пометка сообщения доставленным."""
+        with self._lock:
+            self._connection.execute(
+                'UPDATE outbox SET delivered_at = ? WHERE key = ?',
+                (time.time(), key)
+            )
+
+    def retry_later(self, key):
+        """Перенос отправки с экспоненциально растущей паузой."""
+        with self._lock:
+            attempts = self._connection.execute(
+                'SELECT attempts FROM outbox WHERE key = ?', (key,)
+            ).fetchone()
+            if attempts is None:
+                return
+            delay = min(self.max_delay, self.base_delay * 2 ** attempts[0])
+            self._connection.execute(
+                'UPDATE outbox SET attempts = attempts + 1, '
+                'next_attempt = ? WHERE key = ?',
+                (time.time() + delay, key)
+            )
+
+    def release(self, key):
+        """Возврат выбранного сообщения в очередь без учёта попытки."""
+        with self._lock:
+            self._connection.execute(
+                'UPDATE outbox SET next_attempt = ? '
+                'WHERE key = ? AND delivered_at IS NULL',
+                (time.time(), key)
+            )
+
+    def purge(self, keep=OUTBOX_KEEP_DELIVERED):
+        """Удаление доставленных больше keep секунд назад; их число.
+
+        Записи нужны только для защиты от дублей, поэтому чистка идёт
+        периодически (OUTBOX_PURGE_INTERVAL), а не при каждой выборке.
+        """
+        with self._lock:
+            return self._connection.execute(
+                'DELETE FROM outbox WHERE delivered_at < ?',
+                (time.time() - keep,)
+            ).rowcount
+
+    def pending(self):
+        """Число недоставленных сообщений."""
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL'
+            ).fetchone()[0]
+
+    def close(self):
+        """Закрытие соединения с базой."""
+        with self._lock:
+            self._connection.close()
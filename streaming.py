@@ -0,0 +1,126 @@
+"""Потоковый разбор ответа API без загрузки всего тела в память."""
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """Буфер текста, дочитываемый из итератора байтовых кусков."""
+
+    def __init__(self, chunks):
+        """Чтение из итератора chunks."""
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def more(self):
+        """Дочитывание следующего куска; False, если данные кончились."""
+        for chunk in self._chunks:
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + self._text.decode(chunk)
+                self.pos = 0
+                return True
+        tail = self._text.decode(b'', final=True)
+        if tail:
+            self.buffer = self.buffer[self.pos:] + tail
+            self.pos = 0
+            return True
+        return False
+
+    def peek(self):
+        """Следующий значимый символ или пустая строка в конце данных."""
+        while True:
+            while (self.pos < len(self.buffer)
+                   and self.buffer[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, char):
+        """Пропуск обязательного символа char."""
+        if self.peek() != char:
+            raise ValueError(f'Ответ API оборван или повреждён: нет {char!r}.')
+        self.pos += 1
+
+    def next_item(self, closing):
+        """Переход к следующему элементу; False, если встретился closing."""
+        while True:
+            char = self.peek()
+            if char == closing:
+                self.pos += 1
+                return False
+            if not char:
+                raise ValueError('Ответ API оборван.')
+            if char != ',':
+                return True
+            self.pos += 1
+
+    def value(self):
+        """Очередное JSON-значение целиком."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            if end == len(self.buffer) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_homeworks(chunks, meta):
+    """Работы из ответа API по одной.
+
+    Остальные ключи верхнего уровня (например current_date) попадают в
+    словарь meta. Нарушение структуры ответа приводит к TypeError, как в
+    check_response.
+    """
+    reader = _Reader(chunks)
+    if reader.peek() != '{':
+        raise TypeError('Неверный формат данных.')
+    reader.pos += 1
+    found = False
+    while reader.next_item('}'):
+        key = reader.value()
+        reader.expect(':')
+        if key != 'homeworks':
+            meta[key] = reader.value()
+            continue
+        if reader.peek() != '[':
+            raise TypeError('Неверный формат данных.')
+        reader.pos += 1
+        found = True
+        while reader.next_item(']'):
+            yield reader.value()
+    if not found:
+        raise TypeError('Неверный формат данных.')
+
+
+class StreamedAnswer:
+    """Ответ API, работы из которого читаются по мере получения."""
+
+    def __init__(self, chunks, close=None):
+        """Куски тела ответа и функция закрытия соединения."""
+        self.meta = {}
+        self._homeworks = iter_homeworks(chunks, self.meta)
+        self._close = close
+
+    def __iter__(self):
+        try:
+            yield from self._homeworks
+        finally:
+            if self._close is not None:
+                self._close()
+
+    @property
+    def current_date(self):
+        """Значение current_date, доступное после чтения всех работ."""
+        return self.meta.get('current_date')
@@ -0,0 +1,442 @@
+"""Опрос пользователей в нескольких процессах: шарды по кольцу хешей."""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from dataclasses import dataclass, field
+
+import telegram
+
+import engine
+import homework
+import lifecycle
+import metrics
+from lease import LeaseStore
+from ratelimit import TELEGRAM_GLOBAL_RATE, RateLimitedBot, RateLimiter
+from storage import STATE_DB, Outbox, StateStore
+
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', os.cpu_count() or 1))
+SHARD_REPLICAS = int(os.getenv('SHARD_REPLICAS', 128))
+SHARD_START_METHOD = os.getenv('SHARD_START_METHOD', 'spawn')
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 5))
+HEARTBEAT_TIMEOUT = float(os.getenv('HEARTBEAT_TIMEOUT', 30))
+SUPERVISOR_CHECK_INTERVAL = 1.0
+
+
+def _hash(key):
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class HashRing:
+    """Кольцо согласованного хеширования с виртуальными узлами.
+
+    Каждый узел занимает replicas точек на кольце, ключ принадлежит
+    первому узлу по часовой стрелке. При добавлении или удалении узла
+    меняют владельца только ключи, попавшие на его участки кольца, в
+    среднем 1/N всех ключей.
+    """
+
+    def __init__(self, nodes=(), replicas=SHARD_REPLICAS):
+        """Узлы кольца и число виртуальных точек на узел."""
+        self.replicas = replicas
+        self.nodes = []
+        self._owners = {}
+        self._points = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node):
+        """Добавление узла."""
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            self._owners[_hash(f'{node}#{replica}')] = node
+        self._points = sorted(self._owners)
+
+    def remove(self, node):
+        """Удаление узла; его ключи переходят к соседям по кольцу."""
+        self.nodes.remove(node)
+        self._owners = {
+            point: owner for point, owner in self._owners.items()
+            if owner != node
+        }
+        self._points = sorted(self._owners)
+
+    def node_for(self, key):
+        """Узел, которому принадлежит ключ."""
+        if not self._points:
+            raise LookupError('В кольце нет узлов.')
+        index = bisect.bisect(self._points, _hash(key))
+        return self._owners[self._points[index % len(self._points)]]
+
+    def assign(self, tenants):
+        """Словарь узел -> список его пользователей.
+
+        Ключ шардирования — токен, поэтому пользователи с общим токеном
+        попадают в один процесс и их запросы объединяются.
+        """
+        shards = {node: [] for node in self.nodes}
+        for tenant in tenants:
+            shards[self.node_for(tenant.token)].append(tenant)
+        return shards
+
+
+def shard_stats(polling):
+    """Показатели процесса шарда, которые уходят супервизору с heartbeat."""
+    return {
+        'tenants': len(polling.tenants),
+        'requests': metrics.STAGE_SECONDS.count(stage='get_api_answer'),
+        'cycle_failures': metrics.CYCLE_FAILURES.value(),
+        'cycle_overruns': metrics.CYCLE_OVERRUNS.value(),
+        'send_queue': polling.outgoing.depth,
+        'send_queue_max': polling.outgoing.max_depth,
+        'send_rejected': polling.outgoing.rejected,
+        'send_failed': polling.outgoing.failed,
+        'send_wait_seconds': polling.outgoing.wait_seconds,
+        'outbox': polling.outbox.pending(),
+    }
+
+
+async def serve_shard(polling, shard, heartbeats, interval=None):
+    """Опрос шарда с отправкой heartbeat каждые interval секунд."""
+    interval = interval or HEARTBEAT_INTERVAL
+
+    async def beat():
+        while True:
+            heartbeats.put((shard, os.getpid(), shard_stats(polling)))
+            await asyncio.sleep(interval)
+
+    beating = asyncio.ensure_future(beat())
+    try:
+        await polling.run(handle_signals=True)
+    finally:
+        beating.cancel()
+
+
+class SharedRateLimiter(RateLimiter):
+    """Ограничитель, общий лимит которого задаёт супервизор.
+
+    share — multiprocessing.Value с долей TELEGRAM_GLOBAL_RATE для одного
+    процесса. Доля перечитывается перед каждой отправкой, поэтому после
+    изменения числа процессов её сразу видят и шарды, которые не
+    перезапускались.
+    """
+
+    def __init__(self, share, **kwargs):
+        """Доля общего лимита и остальные параметры RateLimiter."""
+        super().__init__(global_rate=share.value, **kwargs)
+        self.share = share
+
+    def wait(self, chat_id, deadline=None):
+        """Ожидание разрешения на отправку с текущей долей лимита."""
+        self.set_global_rate(self.share.value)
+        return super().wait(chat_id, deadline)
+
+
+def run_worker(shard, records, heartbeats, share, state_db=STATE_DB):
+    """Процесс шарда: PollingEngine для пользователей из records.
+
+    Общий лимит телеграмма делится между процессами: share — доля одного
+    процесса. Курсоры, outbox и аренды хранятся в общей базе state_db.
+    SIGINT игнорируется: остановкой шардов управляет супервизор через
+    SIGTERM.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format=f'%(asctime)s, %(levelname)s, {shard}, %(message)s',
+    )
+    bot = RateLimitedBot(
+        telegram.Bot(token=homework.TELEGRAM_TOKEN),
+        SharedRateLimiter(share),
+    )
+    tenants = [engine.Tenant(**record) for record in records]
+    polling = engine.PollingEngine(
+        bot, tenants, state=StateStore(state_db), outbox=Outbox(state_db),
+        leases=LeaseStore(state_db),
+    )
+    asyncio.run(serve_shard(polling, shard, heartbeats))
+
+
+@dataclass
+class Shard:
+    """Процесс шарда и его последний heartbeat."""
+
+    name: str
+    tenants: list
+    process: multiprocessing.Process = None
+    started: float = 0.0
+    heartbeat: float = None
+    stats: dict = field(default_factory=dict)
+    restarts: int = 0
+
+    @property
+    def alive(self):
+        """Жив ли процесс."""
+        return self.process is not None and self.process.is_alive()
+
+    def heartbeat_age(self, now):
+        """Секунды с последнего heartbeat или с запуска процесса."""
+        return now - (self.heartbeat or self.started)
+
+
+class Supervisor:
+    """Процессы-шарды, каждый опрашивает свою часть пользователей.
+
+    Пользователи распределяются по шардам кольцом HashRing, поэтому при
+    изменении числа процессов resize перезапускает только шарды, чей
+    состав изменился, а доля общего лимита телеграмма меняется у всех
+    через общую переменную. Курсоры и outbox общие, так что перенесённый
+    пользователь продолжает с того же места. Процесс, который завершился
+    или не присылал heartbeat дольше heartbeat_timeout секунд,
+    перезапускается.
+    """
+
+    def __init__(self, tenants, workers=SHARD_WORKERS, target=run_worker,
+                 start_method=SHARD_START_METHOD,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 shutdown_timeout=lifecycle.SHUTDOWN_TIMEOUT,
+                 state_db=STATE_DB):
+        """Пользователи, число процессов и функция процесса шарда.
+
+        База state_db общая для всех процессов, поэтому должна быть
+        файлом: с ':memory:' каждый шард получил бы своё пустое состояние.
+        """
+        if state_db == ':memory:':
+            raise ValueError(
+                'Шардам нужна общая база состояния: STATE_DB должна '
+                'указывать на файл, а не на :memory:.'
+            )
+        self.tenants = list(tenants)
+        self.state_db = state_db
+        self.target = target
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.ring = HashRing(self._name(index) for index in range(workers))
+        self.shards = {}
+        self._context = multiprocessing.get_context(start_method)
+        self._heartbeats = self._context.Queue()
+        self.share = self._context.Value('d', self._share(workers))
+        self._stopping = False
+        self._resize_by = 0
+
+    @staticmethod
+    def _name(index):
+        return f'shard-{index}'
+
+    @staticmethod
+    def _share(workers):
+        return TELEGRAM_GLOBAL_RATE / max(workers, 1)
+
+    def _start(self, shard):
+        records = [
+            {'name': tenant.name, 'token': tenant.token,
+             'chat_id': tenant.chat_id}
+            for tenant in shard.tenants
+        ]
+        shard.process = self._context.Process(
+            target=self.target, name=shard.name,
+            args=(
+                shard.name, records, self._heartbeats, self.share,
+                self.state_db,
+            ),
+        )
+        shard.process.start()
+        shard.started = time.monotonic()
+        shard.heartbeat = None
+        metrics.SHARD_TENANTS.set(len(shard.tenants), shard=shard.name)
+        logging.info(
+            f'{shard.name}: запущен процесс {shard.process.pid}, '
+            f'пользователей: {len(shard.tenants)}.'
+        )
+
+    def _stop(self, shards):
+        """Остановка процессов: SIGTERM, затем SIGKILL после таймаута."""
+        running = [shard for shard in shards if shard.alive]
+        for shard in running:
+            shard.process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for shard in running:
+            shard.process.join(max(deadline - time.monotonic(), 0))
+            if shard.process.is_alive():
+                logging.warning(f'{shard.name}: процесс не остановился.')
+                shard.process.kill()
+                shard.process.join()
+
+    def rebalance(self):
+        """Распределение пользователей по кольцу и перезапуск изменившихся.
+
+        Сначала останавливаются все шарды, которые теряют пользователей,
+        и только потом запускаются новые, чтобы один пользователь не
+        опрашивался двумя процессами одновременно.
+        """
+        assignment = self.ring.assign(self.tenants)
+        changed = [
+            shard for name, shard in self.shards.items()
+            if name not in assignment
+            or [t.name for t in shard.tenants]
+            != [t.name for t in assignment[name]]
+        ]
+        self._stop(changed)
+        for shard in changed:
+            if shard.name not in assignment:
+                del self.shards[shard.name]
+                metrics.SHARD_UP.remove(shard=shard.name)
+                metrics.SHARD_TENANTS.remove(shard=shard.name)
+        for name, tenants in assignment.items():
+            shard = self.shards.setdefault(name, Shard(name, tenants))
+            shard.tenants = tenants
+            if not shard.alive:
+                self._start(shard)
+        return len(changed)
+
+    def start(self):
+        """Запуск процессов всех шардов."""
+        self.rebalance()
+        return self
+
+    def resize(self, workers):
+        """Изменение числа процессов с перераспределением пользователей.
+
+        Доля лимита уменьшается до запуска новых процессов, а
+        увеличивается после остановки лишних, чтобы сумма долей не
+        превышала общий лимит.
+        """
+        workers = max(workers, 1)
+        if workers > len(self.ring):
+            self.share.value = self._share(workers)
+        while len(self.ring) < workers:
+            index = 0
+            while self._name(index) in self.ring.nodes:
+                index += 1
+            self.ring.add(self._name(index))
+        while len(self.ring) > workers:
+            self.ring.remove(self.ring.nodes[-1])
+        restarted = self.rebalance()
+        self.share.value = self._share(workers)
+        logging.info(
+            f'Процессов: {workers}, перезапущено шардов: {restarted}.'
+        )
+
+    def _receive(self):
+        while True:
+            try:
+                name, pid, stats = self._heartbeats.get_nowait()
+            except queue.Empty:
+                return
+            shard = self.shards.get(name)
+            if shard is not None and shard.process.pid == pid:
+                shard.heartbeat = time.monotonic()
+                shard.stats = stats
+
+    def check(self):
+        """Приём heartbeat и перезапуск упавших или зависших шардов."""
+        self._receive()
+        now = time.monotonic()
+        for shard in self.shards.values():
+            stale = shard.heartbeat_age(now) > self.heartbeat_timeout
+            if shard.alive and not stale:
+                metrics.SHARD_UP.set(1, shard=shard.name)
+                continue
+            metrics.SHARD_UP.set(0, shard=shard.name)
+            if shard.alive:
+                logging.error(
+                    f'{shard.name}: нет heartbeat '
+                    f'{shard.heartbeat_age(now):.0f} с, перезапуск.'
+                )
+                self._stop([shard])
+            else:
+                logging.error(
+                    f'{shard.name}: процесс завершился с кодом '
+                    f'{shard.process.exitcode}, перезапуск.'
+                )
+            shard.restarts += 1
+            metrics.SHARD_RESTARTS.inc(shard=shard.name)
+            self._start(shard)
+
+    def health(self):
+        """Состояние шардов: процесс, heartbeat и показатели опроса."""
+        now = time.monotonic()
+        return {
+            name: {
+                'pid': shard.process.pid,
+                'alive': shard.alive,
+                'healthy': shard.alive and shard.heartbeat is not None
+                and shard.heartbeat_age(now) <= self.heartbeat_timeout,
+                'heartbeat_age': shard.heartbeat_age(now),
+                'restarts': shard.restarts,
+                'tenants': len(shard.tenants),
+                **shard.stats,
+            }
+            for name, shard in sorted(self.shards.items())
+        }
+
+    def stop(self):
+        """Остановка всех процессов."""
+        self._stop(self.shards.values())
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGTTIN:
+            self._resize_by += 1
+        elif signum == signal.SIGTTOU:
+            self._resize_by -= 1
+        else:
+            self._stopping = True
+
+    def run(self):
+        """Работа до SIGTERM или SIGINT.
+
+        SIGTTIN добавляет процесс, SIGTTOU убирает один процесс.
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT,
+                       signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, self._on_signal)
+        self.start()
+        try:
+            while not self._stopping:
+                if self._resize_by:
+                    resize_by, self._resize_by = self._resize_by, 0
+                    self.resize(len(self.ring) + resize_by)
+                self.check()
+                time.sleep(SUPERVISOR_CHECK_INTERVAL)
+        finally:
+            logging.info('Остановка процессов шардов.')
+            self.stop()
+
+
+def main():
+    """Запуск супервизора для всех пользователей из TENANTS_FILE."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS,
+                        help='число процессов-шардов')
+    args = parser.parse_args()
+    if not homework.TELEGRAM_TOKEN:
+        logging.critical('Отсутствуют необходимый токен: TELEGRAM_TOKEN!')
+        raise SystemExit('Нет необходимых токенов.')
+    tenants = engine.load_tenants()
+    logging.info(
+        f'Загружено пользователей: {len(tenants)}, '
+        f'процессов: {args.workers}.'
+    )
+    Supervisor(tenants, args.workers).run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s, %(levelname)s, %(message)s',
+    )
+    metrics.start_http_server()
+
+    main()
@@ -0,0 +1,64 @@
+import pytest
+import requests
+
+import breaker
+import utils
+from exeptions import CircuitOpenError
+
+
+class TestCircuitBreaker:
+
+    def make_breaker(self, clock):
+        return breaker.CircuitBreaker(
+            window=10, min_calls=4, failure_rate=0.5, open_seconds=60,
+            probes=1, clock=clock
+        )
+
+    def test_opens_on_failure_rate(self):
+        circuit = self.make_breaker(utils.FakeClock())
+        for _ in range(3):
+            circuit.record_failure()
+        assert circuit.state == breaker.CLOSED, (
+            'До min_calls вызовов цепь не размыкается.'
+        )
+        circuit.record_success()
+        assert circuit.state == breaker.CLOSED
+        circuit.record_failure()
+        assert circuit.state == breaker.OPEN
+        assert not circuit.allow()
+
+    def test_half_open_probe(self):
+        clock = utils.FakeClock()
+        circuit = self.make_breaker(clock)
+        for _ in range(4):
+            circuit.record_failure()
+        clock.now = 61
+        assert circuit.allow()
+        assert circuit.state == breaker.HALF_OPEN
+        assert not circuit.allow(), 'Пропускается только probes запросов.'
+        circuit.record_failure()
+        assert circuit.state == breaker.OPEN
+
+        clock.now = 122
+        assert circuit.allow()
+        circuit.record_success()
+        assert circuit.state == breaker.CLOSED
+        assert circuit.allow()
+
+    def test_open_circuit_skips_requests(self, monkeypatch, homework_module):
+        clock = utils.FakeClock()
+        circuit = self.make_breaker(clock)
+        monkeypatch.setattr(homework_module, 'API_BREAKER', circuit)
+        calls = []
+
+        def failing_get(*args, **kwargs):
+            calls.append(args)
+            return utils.MockResponseGET(http_status=503)
+
+        monkeypatch.setattr(requests, 'get', failing_get)
+        for _ in range(10):
+            with pytest.raises(Exception) as error:
+                homework_module.get_api_answer({'from_date': 0})
+        assert len(calls) == 4
+        assert isinstance(error.value, CircuitOpenError)
+        assert error.value.retry_after == 60
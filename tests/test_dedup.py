@@ -0,0 +1,57 @@
+import utils
+from dedup import ChatErrorDeduplicator, ErrorDeduplicator, fingerprint
+
+
+class TestErrorDeduplicator:
+
+    def test_fingerprint_ignores_numbers(self):
+        assert fingerprint(ConnectionError('код ошибки: 500.')) == (
+            fingerprint(ConnectionError('код ошибки:  502.'))
+        )
+        assert fingerprint(ConnectionError('x')) != fingerprint(KeyError('x'))
+
+    def test_alternating_errors_are_suppressed(self):
+        clock = utils.FakeClock()
+        errors = ErrorDeduplicator(window=60, clock=clock)
+        first, second = ValueError('first'), KeyError('second')
+        sent = [errors.observe(error) for error in (first, second) * 3]
+        assert sent == [True, True, False, False, False, False]
+
+    def test_summary_after_window(self):
+        clock = utils.FakeClock()
+        errors = ErrorDeduplicator(window=60, clock=clock)
+        error = ValueError('boom 1')
+        errors.observe(error)
+        errors.observe(ValueError('boom 2'))
+        errors.observe(ValueError('boom 3'))
+        assert errors.summaries() == []
+        clock.now = 61
+        assert errors.summaries() == [
+            'Ошибка «boom 1» повторилась ещё 2 раз.'
+        ]
+        assert not errors.observe(error), 'Новое окно тоже подавляет повторы.'
+        clock.now = 200
+        errors.summaries()
+        clock.now = 400
+        assert errors.summaries() == []
+        assert errors.observe(error)
+
+    def test_lru_eviction_and_forget(self):
+        errors = ErrorDeduplicator(window=60, max_size=2, clock=utils.FakeClock())
+        for name in ('a', 'b', 'c'):
+            errors.observe(ValueError(name))
+        assert errors.observe(ValueError('a')), 'Старый отпечаток вытеснен.'
+        errors.forget(ValueError('a'))
+        assert errors.observe(ValueError('a'))
+
+    def test_chats_are_tracked_separately(self):
+        clock = utils.FakeClock()
+        errors = ChatErrorDeduplicator(['1', '2'], window=60, clock=clock)
+        error = ValueError('boom')
+        assert errors.observe(error) == ['1', '2']
+        errors.forget(error, '2')
+        assert errors.observe(error) == ['2']
+        clock.now += 61
+        assert errors.summaries() == [
+            ('Ошибка «boom» повторилась ещё 1 раз.', ['1'])
+        ]
@@ -0,0 +1,23 @@
+class TestDiffStatuses:
+
+    def test_only_changed_homeworks_are_returned(self, homework_module):
+        statuses = {'1': 'reviewing', '2': 'approved'}
+        homeworks = [
+            {'id': 3, 'homework_name': 'hw3', 'status': 'reviewing'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'approved'},
+            {'id': 1, 'homework_name': 'hw1', 'status': 'rejected'},
+        ]
+        changed = homework_module.diff_statuses(statuses, homeworks)
+        assert [hw['id'] for hw in changed] == [1, 3], (
+            'Все изменившиеся работы возвращаются от старых к новым.'
+        )
+
+    def test_latest_duplicate_wins(self, homework_module):
+        homeworks = [
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw1', 'status': 'reviewing'},
+        ]
+        changed = homework_module.diff_statuses({}, homeworks)
+        assert changed == [homeworks[0]]
+        assert homework_module.diff_statuses({'hw1': 'approved'},
+                                             homeworks) == []
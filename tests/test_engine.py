@@ -0,0 +1,273 @@
+import asyncio
+import threading
+import time
+
+import requests
+import telegram
+
+import engine
+import metrics
+import storage
+import supervisor
+import utils
+
+
+def mock_get_with_homeworks(homeworks):
+    def mocked_response(*args, **kwargs):
+        response = utils.MockResponseGET(*args, random_timestamp=1, **kwargs)
+        response.json = lambda: {'homeworks': homeworks, 'current_date': 2}
+        return response
+    return mocked_response
+
+
+class TestPollingEngine:
+
+    def make_tenants(self, count):
+        return [
+            engine.Tenant(name=f't{i}', token=f'token{i}', chat_id=str(i))
+            for i in range(count)
+        ]
+
+    def test_poll_sends_status_to_tenant_chat(self, monkeypatch):
+        monkeypatch.setattr(requests, 'get', mock_get_with_homeworks(
+            [{'homework_name': 'hw1', 'status': 'approved'}]
+        ))
+        bot = utils.RecordingBot()
+        tenants = self.make_tenants(3)
+        polling = engine.PollingEngine(
+            bot, tenants, concurrency=2, session=requests
+        )
+
+        async def poll_all():
+            await asyncio.gather(*(polling.poll(t) for t in tenants))
+            await polling.outgoing.join()
+
+        async def poll_twice():
+            await poll_all()
+            first_round = list(bot.sent)
+            await poll_all()
+            return first_round
+
+        first_round = asyncio.run(poll_twice())
+        assert sorted(chat for chat, _ in first_round) == ['0', '1', '2']
+        assert all('hw1' in text for _, text in first_round)
+        assert all(tenant.from_date == 2 for tenant in tenants)
+        assert len(bot.sent) == 3, (
+            'Повторный статус не должен отправляться второй раз.'
+        )
+
+    def test_poll_concurrency_is_bounded(self, monkeypatch):
+        lock = threading.Lock()
+        active = {'now': 0, 'max': 0}
+
+        def slow_get(*args, **kwargs):
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.02)
+            with lock:
+                active['now'] -= 1
+            return utils.MockResponseGET(random_timestamp=1)
+
+        monkeypatch.setattr(requests, 'get', slow_get)
+        tenants = self.make_tenants(10)
+        polling = engine.PollingEngine(
+            utils.RecordingBot(), tenants, concurrency=3, session=requests
+        )
+
+        async def poll_all():
+            await asyncio.gather(*(polling.poll(t) for t in tenants))
+
+        asyncio.run(poll_all())
+        assert active['max'] <= 3
+
+    def test_poll_reports_error_once(self, monkeypatch):
+
+        def failing_get(*args, **kwargs):
+            raise requests.RequestException('Something wrong')
+
+        monkeypatch.setattr(requests, 'get', failing_get)
+        bot = utils.RecordingBot()
+        tenant = self.make_tenants(1)[0]
+        polling = engine.PollingEngine(bot, [tenant], session=requests)
+
+        async def poll_twice():
+            await polling.poll(tenant)
+            await polling.outgoing.join()
+            await polling.poll(tenant)
+            await polling.outgoing.join()
+
+        asyncio.run(poll_twice())
+        assert len(bot.sent) == 1
+        assert bot.sent[0][1].startswith('Сбой в работе программы')
+
+    def test_request_has_timeouts(self, monkeypatch):
+        calls = []
+
+        def recording_get(*args, **kwargs):
+            calls.append(kwargs)
+            return utils.MockResponseGET(random_timestamp=1)
+
+        monkeypatch.setattr(requests, 'get', recording_get)
+        tenant = self.make_tenants(1)[0]
+        polling = engine.PollingEngine(
+            utils.RecordingBot(), [tenant], session=requests
+        )
+        asyncio.run(polling.poll(tenant))
+        assert calls[0].get('timeout'), (
+            'Запрос к API должен выполняться с таймаутом.'
+        )
+
+    def test_overrun_cycle_is_cancelled(self, monkeypatch):
+        def slow_get(*args, **kwargs):
+            time.sleep(0.2)
+            return utils.MockResponseGET(random_timestamp=1)
+
+        monkeypatch.setattr(requests, 'get', slow_get)
+        bot = utils.RecordingBot()
+        tenant = self.make_tenants(1)[0]
+        polling = engine.PollingEngine(
+            bot, [tenant], session=requests, budget=0.05
+        )
+        overruns = metrics.CYCLE_OVERRUNS.value()
+
+        async def poll_once():
+            started = time.monotonic()
+            delay = await polling.poll(tenant)
+            elapsed = time.monotonic() - started
+            await polling.outgoing.join()
+            return delay, elapsed
+
+        delay, elapsed = asyncio.run(poll_once())
+        assert elapsed < 0.2, 'Цикл должен прерываться по бюджету.'
+        assert delay >= tenant.scheduler.min_period
+        assert tenant.scheduler.failures == 1
+        assert metrics.CYCLE_OVERRUNS.value() == overruns + 1
+        assert bot.sent and 'не уложился' in bot.sent[0][1]
+
+    def test_failed_delivery_is_retried_from_outbox(self, monkeypatch):
+        monkeypatch.setattr(requests, 'get', mock_get_with_homeworks(
+            [{'homework_name': 'hw1', 'status': 'approved'}]
+        ))
+        bot = utils.RecordingBot()
+        attempts = []
+
+        def flaky_send(chat_id=None, text=None, **kwargs):
+            attempts.append(text)
+            if len(attempts) == 1:
+                raise telegram.error.TelegramError('Something wrong')
+            bot.sent.append((chat_id, text))
+
+        monkeypatch.setattr(bot, 'send_message', flaky_send)
+        tenant = self.make_tenants(1)[0]
+        outbox = storage.Outbox(base_delay=0)
+        polling = engine.PollingEngine(
+            bot, [tenant], session=requests, outbox=outbox
+        )
+
+        async def poll_and_retry():
+            await polling.poll(tenant)
+            await polling.outgoing.join()
+            assert outbox.pending() == 1
+            await polling.poll(tenant)
+            await polling.flush_outbox()
+            await polling.outgoing.join()
+
+        asyncio.run(poll_and_retry())
+        assert len(attempts) == 2
+        assert len(bot.sent) == 1, 'Сообщение доставлено ровно один раз.'
+        assert outbox.pending() == 0
+
+    def test_full_queue_does_not_block_poll(self, monkeypatch):
+        monkeypatch.setattr(requests, 'get', mock_get_with_homeworks(
+            [{'id': i, 'homework_name': f'hw{i}', 'status': 'approved'}
+             for i in range(5)]
+        ))
+        tenant = self.make_tenants(1)[0]
+        polling = engine.PollingEngine(
+            utils.RecordingBot(), [tenant], session=requests
+        )
+        polling.outgoing.maxsize = 2
+        rejected = metrics.SEND_QUEUE_REJECTED.value()
+        waits = metrics.SEND_QUEUE_WAIT.count()
+
+        async def poll_once():
+            await polling.poll(tenant)
+            stats = polling.outgoing.stats()
+            await polling.outgoing.join()
+            return stats
+
+        stats = asyncio.run(poll_once())
+        assert stats['enqueued'] == 2
+        assert stats['rejected'] == 1
+        assert polling.outbox.pending() == 3
+        assert len(tenant.statuses) == 5
+        assert metrics.SEND_QUEUE_REJECTED.value() == rejected + 1
+        assert metrics.SEND_QUEUE_WAIT.count() == waits + 2
+        assert 'homework_bot_send_queue_max_depth' in metrics.REGISTRY.render()
+        heartbeat = supervisor.shard_stats(polling)
+        assert heartbeat['send_rejected'] == 1
+        assert heartbeat['send_queue_max'] == 2
+
+    def test_request_poll_and_request_stop(self, monkeypatch):
+        requested = []
+        mocked_get = mock_get_with_homeworks(
+            [{'homework_name': 'hw1', 'status': 'approved'}]
+        )
+
+        def counting_get(*args, **kwargs):
+            requested.append(time.monotonic())
+            return mocked_get(*args, **kwargs)
+
+        monkeypatch.setattr(requests, 'get', counting_get)
+        bot = utils.RecordingBot()
+        tenant = self.make_tenants(1)[0]
+        polling = engine.PollingEngine(
+            bot, [tenant], period=600, session=requests
+        )
+
+        async def wait_for_requests(count):
+            while len(requested) < count:
+                await asyncio.sleep(0.01)
+
+        async def control():
+            running = asyncio.ensure_future(polling.run())
+            await asyncio.wait_for(wait_for_requests(1), 2)
+            polling.request_poll()
+            await asyncio.wait_for(wait_for_requests(2), 2)
+            polling.request_stop()
+            await asyncio.wait_for(running, 2)
+
+        asyncio.run(control())
+        assert len(requested) == 2
+        assert len(bot.sent) == 1
+        assert polling.outbox.pending() == 0
+
+    def test_slow_sends_do_not_starve_polls(self, monkeypatch):
+        monkeypatch.setattr(requests, 'get', mock_get_with_homeworks(
+            [{'homework_name': 'hw1', 'status': 'approved'}]
+        ))
+        release = threading.Event()
+
+        class StuckBot(utils.RecordingBot):
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                release.wait(5)
+                super().send_message(chat_id, text)
+
+        bot = StuckBot()
+        tenants = self.make_tenants(3)
+        polling = engine.PollingEngine(
+            bot, tenants, concurrency=1, session=requests
+        )
+
+        async def poll_while_sends_hang():
+            await polling.poll(tenants[0])
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(
+                asyncio.gather(*(polling.poll(t) for t in tenants[1:])), 2
+            )
+            release.set()
+            await polling.outgoing.join()
+
+        asyncio.run(poll_while_sends_hang())
+        assert len(bot.sent) == 3
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+import telegram
+
+import engine
+import storage
+import utils
+from dedup import ChatErrorDeduplicator
+from exeptions import PartialDeliveryError, SendMessageError
+from fanout import fan_out
+from scheduler import Deadline
+
+
+class FlakyBot:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        if chat_id in self.failing:
+            raise telegram.error.TelegramError('Chat not found')
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+
+class TestFanOut:
+
+    def test_recipients_are_served_in_parallel_within_bound(self):
+        lock = threading.Lock()
+        active = {'now': 0, 'max': 0}
+
+        def send(recipient, message):
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.02)
+            with lock:
+                active['now'] -= 1
+            if recipient == 'bad':
+                raise ValueError(recipient)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = fan_out(
+                send, ['a', 'b', 'bad', 'c', 'd', 'a'], 'text', executor
+            )
+        assert list(results) == ['a', 'b', 'bad', 'c', 'd']
+        assert isinstance(results.pop('bad'), ValueError)
+        assert set(results.values()) == {None}
+        assert 1 < active['max'] <= 3
+
+
+class TestSendMessageToMany:
+
+    def test_message_reaches_all_chats(self, homework_module, monkeypatch):
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1, 2,3')
+        bot = FlakyBot()
+        homework_module.send_message(bot, 'text')
+        assert sorted(bot.sent) == [('1', 'text'), ('2', 'text'),
+                                    ('3', 'text')]
+
+    def test_partial_and_full_failure(self, homework_module, monkeypatch):
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1,2,3')
+        with pytest.raises(PartialDeliveryError) as info:
+            homework_module.send_message(FlakyBot(failing={'2'}), 'text')
+        assert info.value.failed == ['2']
+        with pytest.raises(SendMessageError):
+            homework_module.send_message(
+                FlakyBot(failing={'1', '2', '3'}), 'text'
+            )
+
+    def test_only_failed_chats_are_retried(self, homework_module,
+                                           monkeypatch):
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1,2,3')
+        response = utils.MockResponseGET(random_timestamp=1)
+        response.json = lambda: {
+            'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': 1,
+        }
+        monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: response)
+        state = storage.StateStore()
+        outbox = storage.Outbox(base_delay=0)
+        bot = FlakyBot(failing={'2'})
+        homework_module.poll_cycle(
+            bot, state, outbox, {'from_date': 0}, {}
+        )
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '3']
+        assert outbox.pending() == 1
+        bot.failing.clear()
+        homework_module.deliver_pending(bot, outbox)
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '2', '3']
+        assert outbox.pending() == 0
+
+    def test_engine_sends_rows_written_by_poll_cycle(self, homework_module,
+                                                     monkeypatch):
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1,2')
+        response = utils.MockResponseGET(random_timestamp=1)
+        response.json = lambda: {
+            'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': 1,
+        }
+        monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: response)
+        outbox = storage.Outbox()
+        homework_module.poll_cycle(
+            FlakyBot(failing={'1', '2'}), storage.StateStore(), outbox,
+            {'from_date': 0}, {}, Deadline(0)
+        )
+        bot = FlakyBot()
+        polling = engine.PollingEngine(bot, [], outbox=outbox)
+
+        async def flush():
+            await polling.flush_outbox()
+            await polling.outgoing.join()
+
+        asyncio.run(flush())
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '2']
+
+    def test_error_is_repeated_only_to_failed_chats(self, homework_module):
+        errors = ChatErrorDeduplicator(['1', '2', '3'])
+        bot = FlakyBot(failing={'2'})
+        error = ConnectionError('boom')
+        homework_module.report_errors(bot, errors, error)
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '3']
+        bot.failing.clear()
+        bot.sent.clear()
+        homework_module.report_errors(bot, errors, error)
+        assert [chat for chat, _ in bot.sent] == ['2'], (
+            'Чаты, получившие сообщение об ошибке, его не получают снова.'
+        )
+
+
+class TestEngineRecipients:
+
+    def test_load_tenants_accepts_chat_list(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(
+            '[{"name": "group", "token": "t", "chat_id": [1, "2"]}]',
+            encoding='utf-8'
+        )
+        tenant, = engine.load_tenants(str(path))
+        assert tenant.recipients == ['1', '2']
+
+    def test_status_is_sent_to_every_recipient(self, monkeypatch):
+        def mock_get(*args, **kwargs):
+            response = utils.MockResponseGET(random_timestamp=1)
+            response.json = lambda: {
+                'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+                'current_date': 2,
+            }
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        bot = FlakyBot(failing={'2'})
+        outbox = storage.Outbox()
+        tenant = engine.Tenant(name='group', token='t', chat_id='1,2,3')
+        polling = engine.PollingEngine(
+            bot, [tenant], session=requests, outbox=outbox
+        )
+
+        async def poll():
+            await polling.poll(tenant)
+            await polling.outgoing.join()
+
+        asyncio.run(poll())
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '3']
+        assert outbox.pending() == 1, (
+            'Повторно отправляется только сообщение для чата с ошибкой.'
+        )
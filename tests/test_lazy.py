@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+from lazy import LazyObject, lazy_import
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLazyImport:
+
+    def test_module_loads_on_first_attribute(self, monkeypatch):
+        monkeypatch.delitem(sys.modules, 'wave', raising=False)
+        wave = lazy_import('wave')
+        assert sys.modules['wave'] is wave
+        assert type(wave) is not types.ModuleType, (
+            'Модуль не должен выполняться до первого обращения.'
+        )
+        assert callable(wave.open)
+        assert type(wave) is types.ModuleType
+
+    def test_imported_module_is_returned_as_is(self):
+        assert lazy_import('os') is os
+
+    def test_missing_module(self):
+        with pytest.raises(ModuleNotFoundError):
+            lazy_import('no_such_module_here')
+
+    def test_homework_import_skips_heavy_dependencies(self):
+        code = (
+            'import sys, homework; '
+            'print(any(name in sys.modules for name in '
+            '("telegram.bot", "requests.sessions", "http.server")))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        assert result.stdout.strip() == 'False', (
+            'Импорт homework не должен загружать telegram, requests и '
+            'http.server.'
+        )
+
+    def test_lazy_object_is_created_on_first_attribute(self):
+        created = []
+
+        def factory():
+            created.append(True)
+            return types.SimpleNamespace(value=1)
+
+        lazy = LazyObject(factory)
+        assert created == []
+        assert lazy.value == 1
+        assert lazy.value == 1
+        assert created == [True]
+
+    def test_once_without_changes_skips_telegram(self, tmp_path):
+        code = (
+            'import sys, homework, requests\n'
+            'class Response:\n'
+            '    status_code = 200\n'
+            '    headers = {}\n'
+            '    def json(self):\n'
+            '        return {"homeworks": [], "current_date": 1}\n'
+            'requests.get = lambda *args, **kwargs: Response()\n'
+            'homework.run_once(sys.argv[1])\n'
+            'print("telegram.bot" in sys.modules)\n'
+        )
+        env = dict(
+            os.environ, PRACTICUM_TOKEN='token', TELEGRAM_TOKEN='1234:abcd',
+            TELEGRAM_CHAT_ID='12345',
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code, str(tmp_path / 'state.sqlite3')],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+            check=True,
+        )
+        assert result.stdout.strip().splitlines()[-1] == 'False', (
+            'Разовый запуск без изменений не должен загружать telegram.'
+        )
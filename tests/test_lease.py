@@ -0,0 +1,253 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from functools import partial
+
+import pytest
+import requests
+import telegram
+
+import engine
+import lease
+import storage
+import utils
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+def dead_owner():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return f'{socket.gethostname()}:{process.pid}:dead'
+
+
+class TestLeaseStore:
+
+    def test_only_one_owner_holds_tenant(self, path):
+        first = lease.LeaseStore(path, owner='a')
+        second = lease.LeaseStore(path, owner='b')
+        assert first.acquire(['t1', 't2']) == {'t1', 't2'}
+        assert second.acquire(['t1', 't2', 't3']) == {'t3'}
+        assert first.held('t1') and not second.held('t1')
+        assert first.holder('t1') == 'a'
+        assert first.acquire(['t1']) == {'t1'}, 'Владелец продлевает аренду.'
+
+    def test_expired_lease_is_taken_over(self, path):
+        clock = utils.FakeClock(1000.0)
+        first = lease.LeaseStore(path, owner='a', ttl=30, clock=clock)
+        second = lease.LeaseStore(path, owner='b', ttl=30, clock=clock)
+        first.acquire(['t1'])
+        clock.now += 29
+        assert second.acquire(['t1']) == set()
+        clock.now += 2
+        assert not first.held('t1'), 'Непродлённая аренда не своя.'
+        assert second.acquire(['t1']) == {'t1'}
+        assert first.acquire(['t1']) == set()
+        assert not first.held('t1')
+
+    def test_release_allows_immediate_takeover(self, path):
+        first = lease.LeaseStore(path, owner='a')
+        second = lease.LeaseStore(path, owner='b')
+        first.acquire(['t1'])
+        first.release(['t1'])
+        assert not first.held('t1')
+        assert second.acquire(['t1']) == {'t1'}
+
+    def test_lease_of_dead_local_owner_is_taken_over(self, path):
+        crashed = lease.LeaseStore(path, owner=dead_owner())
+        crashed.acquire(['t1'])
+        survivor = lease.LeaseStore(path)
+        assert survivor.acquire(['t1']) == {'t1'}
+
+    def test_lease_of_remote_owner_waits_for_expiry(self, path):
+        remote = lease.LeaseStore(path, owner='elsewhere:1:x')
+        remote.acquire(['t1'])
+        assert lease.LeaseStore(path).acquire(['t1']) == set()
+
+    def test_owner_in_other_process_excludes(self, path):
+        code = (
+            'import sys, lease; '
+            'print(lease.LeaseStore(sys.argv[1], owner="elsewhere:1:x")'
+            '.acquire(["t1"]))'
+        )
+        subprocess.run([sys.executable, '-c', code, path], check=True)
+        store = lease.LeaseStore(path)
+        assert store.durable
+        assert store.acquire(['t1']) == set()
+        assert store.holder('t1') == 'elsewhere:1:x'
+
+    def test_memory_store_is_not_durable(self):
+        assert not lease.LeaseStore(':memory:').durable
+
+    def test_lease_key_normalizes_chat_list(self):
+        assert lease.lease_key('2, 1') == lease.lease_key('1,2') == '1,2'
+        assert lease.lease_key(12345) == '12345'
+
+    def test_keeper_renews_and_releases(self, path):
+        leases = lease.LeaseStore(path, owner='a')
+        keeper = lease.LeaseKeeper(leases, ['t1'], interval=0.01).start()
+        assert leases.held('t1')
+        keeper.stop()
+        assert not leases.held('t1')
+        assert leases.holder('t1') is None
+
+
+class TestSingleActivePoller:
+
+    def setup_tokens(self, homework_module):
+        homework_module.PRACTICUM_TOKEN = 'sometoken'
+        homework_module.TELEGRAM_TOKEN = '1234:abcdefg'
+        homework_module.TELEGRAM_CHAT_ID = '12345'
+
+    def test_standby_main_does_not_poll(self, monkeypatch, path,
+                                        homework_module):
+        self.setup_tokens(homework_module)
+        lease.LeaseStore(path, owner='elsewhere:1:x').acquire(['12345'])
+        requested = []
+        delays = []
+
+        class BreakInfiniteLoop(Exception):
+            pass
+
+        def stop_sleep(delay):
+            delays.append(delay)
+            raise BreakInfiniteLoop
+
+        monkeypatch.setattr(
+            requests, 'get', lambda *args, **kwargs: requested.append(args)
+        )
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(
+            homework_module, 'LeaseStore', lambda: lease.LeaseStore(path)
+        )
+        monkeypatch.setattr(homework_module.time, 'sleep', stop_sleep)
+        with pytest.raises(BreakInfiniteLoop):
+            homework_module.main()
+        assert requested == []
+        assert delays == [lease.LEASE_RENEW_INTERVAL]
+
+    def test_run_once_skips_tenant_held_elsewhere(self, monkeypatch, path,
+                                                  homework_module):
+        self.setup_tokens(homework_module)
+        holder = lease.LeaseStore(path, owner='elsewhere:1:x')
+        holder.acquire(['12345'])
+        monkeypatch.setattr(requests, 'get', None)
+        assert homework_module.run_once(path) == 0
+        assert holder.holder('12345') == 'elsewhere:1:x'
+
+    def homework_response(self):
+        response = utils.MockResponseGET(random_timestamp=1)
+        response.json = lambda: {
+            'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': 1,
+        }
+        return response
+
+    def test_run_once_keeps_lease_through_long_cycle(self, monkeypatch,
+                                                     path, homework_module):
+        self.setup_tokens(homework_module)
+        rival = lease.LeaseStore(path, owner='elsewhere:1:x', ttl=0.3)
+        taken = []
+
+        def slow_get(*args, **kwargs):
+            time.sleep(0.6)
+            taken.append(rival.acquire(['12345']))
+            return self.homework_response()
+
+        monkeypatch.setattr(requests, 'get', slow_get)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(
+            homework_module, 'LeaseStore',
+            lambda path: lease.LeaseStore(path, ttl=0.3)
+        )
+        monkeypatch.setattr(
+            homework_module, 'LeaseKeeper',
+            partial(lease.LeaseKeeper, interval=0.05)
+        )
+        assert homework_module.run_once(path) == 0
+        assert taken == [set()]
+        assert storage.Outbox(path).pending() == 0
+        assert rival.acquire(['12345']) == {'12345'}
+
+    def test_lost_lease_keeps_notifications_in_outbox(self, monkeypatch,
+                                                      homework_module):
+        self.setup_tokens(homework_module)
+        monkeypatch.setattr(
+            requests, 'get', lambda *args, **kwargs: self.homework_response()
+        )
+        bot = utils.MockTelegramBot()
+        outbox = storage.Outbox(base_delay=0)
+        homework_module.poll_cycle(
+            bot, storage.StateStore(), outbox, {'from_date': 0}, {},
+            leading=lambda: False,
+        )
+        assert not hasattr(bot, 'text')
+        assert outbox.pending() == 1
+
+    def test_engine_polls_only_leased_tenants(self, monkeypatch, path):
+        requested = []
+
+        def mock_get(*args, headers=None, **kwargs):
+            requested.append(headers['Authorization'])
+            return utils.MockResponseGET(random_timestamp=1)
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        lease.LeaseStore(path, owner='elsewhere:1:x').acquire(['0'])
+        tenants = [
+            engine.Tenant(name=f't{i}', token=f'token{i}', chat_id=str(i))
+            for i in range(2)
+        ]
+        leases = lease.LeaseStore(path)
+        polling = engine.PollingEngine(
+            utils.MockTelegramBot(), tenants, session=requests,
+            leases=leases,
+        )
+        leases.acquire(['0', '1'])
+
+        async def poll_all():
+            return [await polling.poll(tenant) for tenant in tenants]
+
+        delays = asyncio.run(poll_all())
+        assert delays[0] == lease.LEASE_RENEW_INTERVAL
+        assert requested == ['OAuth token1']
+
+    def test_engine_skips_chat_held_by_single_user_bot(self, monkeypatch,
+                                                       path):
+        monkeypatch.setattr(requests, 'get', None)
+        lease.LeaseStore(path, owner='elsewhere:1:x').acquire(
+            [lease.lease_key('12345')]
+        )
+        tenant = engine.Tenant(name='student', token='token', chat_id='12345')
+        leases = lease.LeaseStore(path)
+        polling = engine.PollingEngine(
+            utils.MockTelegramBot(), [tenant], session=requests,
+            leases=leases,
+        )
+        leases.acquire([tenant.lease_key])
+        delay = asyncio.run(polling.poll(tenant))
+        assert delay == lease.LEASE_RENEW_INTERVAL
+
+    def test_main_warns_about_volatile_leases(self, monkeypatch, caplog,
+                                              homework_module):
+        self.setup_tokens(homework_module)
+
+        class BreakInfiniteLoop(Exception):
+            pass
+
+        def stop_sleep(delay):
+            raise BreakInfiniteLoop
+
+        monkeypatch.setattr(
+            requests, 'get',
+            lambda *args, **kwargs: utils.MockResponseGET(random_timestamp=1)
+        )
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(homework_module.time, 'sleep', stop_sleep)
+        with pytest.raises(BreakInfiniteLoop):
+            homework_module.main()
+        assert lease.VOLATILE_LEASES in caplog.text
@@ -0,0 +1,105 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+import requests
+import telegram
+
+import lifecycle
+import utils
+
+
+@pytest.fixture
+def signals():
+    handlers = lifecycle.Signals(shutdown_timeout=5)
+    handlers.install()
+    yield handlers
+    handlers.close()
+
+
+def send_later(signum, seconds=0.1):
+    timer = threading.Timer(seconds, os.kill, (os.getpid(), signum))
+    timer.start()
+    return timer
+
+
+class TestSignals:
+
+    def test_wait_sleeps_without_signals(self, signals):
+        started = time.monotonic()
+        signals.wait(0.2)
+        assert time.monotonic() - started >= 0.2
+
+    def test_poll_signal_interrupts_wait(self, signals):
+        send_later(signal.SIGUSR1)
+        started = time.monotonic()
+        signals.wait(5)
+        assert time.monotonic() - started < 2
+        assert not signals.stopping
+
+    def test_signal_during_cycle_is_not_lost(self, signals):
+        os.kill(os.getpid(), signal.SIGUSR1)
+        started = time.monotonic()
+        signals.wait(5)
+        assert time.monotonic() - started < 1
+
+    def test_other_signals_do_not_interrupt_wait(self, signals):
+        previous = signal.signal(signal.SIGUSR2, lambda *args: None)
+        try:
+            send_later(signal.SIGUSR2, 0.05)
+            started = time.monotonic()
+            signals.wait(0.3)
+            assert time.monotonic() - started >= 0.3
+        finally:
+            signal.signal(signal.SIGUSR2, previous)
+
+    def test_stop_signal_interrupts_wait(self, signals):
+        send_later(signal.SIGTERM)
+        started = time.monotonic()
+        signals.wait(5)
+        assert time.monotonic() - started < 2
+        assert signals.stopping
+        assert 0 < signals.deadline.remaining() <= 5
+
+    def test_close_restores_handlers(self):
+        previous = signal.getsignal(signal.SIGTERM)
+        handlers = lifecycle.Signals()
+        handlers.install()
+        handlers.close()
+        assert signal.getsignal(signal.SIGTERM) is previous
+        assert signal.set_wakeup_fd(-1) == -1
+
+
+class TestGracefulShutdown:
+
+    def test_main_flushes_and_exits_on_sigterm(self, monkeypatch, signals,
+                                               homework_module):
+        homework_module.PRACTICUM_TOKEN = 'sometoken'
+        homework_module.TELEGRAM_TOKEN = '1234:abcdefg'
+        homework_module.TELEGRAM_CHAT_ID = '12345'
+        sent = []
+
+        def mock_get(*args, **kwargs):
+            response = utils.MockResponseGET(*args, random_timestamp=1,
+                                             **kwargs)
+            response.json = lambda: {
+                'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+                'current_date': 2,
+            }
+            return response
+
+        monkeypatch.setattr(lifecycle, 'SIGNALS', signals)
+        monkeypatch.setattr(requests, 'get', mock_get)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(
+            homework_module, 'send_message',
+            lambda bot, text: sent.append(text)
+        )
+        send_later(signal.SIGTERM, 0.3)
+        started = time.monotonic()
+        homework_module.main()
+        assert time.monotonic() - started < 5
+        assert len(sent) == 1
+        assert 'hw1' in sent[0]
@@ -0,0 +1,67 @@
+import logging
+import random
+
+import pytest
+
+import logsetup
+
+
+class TestSampling:
+
+    def test_parse_rates(self):
+        assert logsetup.parse_rates('') == {}
+        assert logsetup.parse_rates('debug=0.1, INFO=1') == {
+            logging.DEBUG: 0.1, logging.INFO: 1.0
+        }
+        with pytest.raises(ValueError):
+            logsetup.parse_rates('CHATTY=0.5')
+
+    def test_only_sampled_levels_are_dropped(self):
+        sampling = logsetup.SamplingFilter(
+            {logging.DEBUG: 0.1}, rng=random.Random(0)
+        )
+
+        def passed(level):
+            return sum(
+                sampling.filter(logging.LogRecord(
+                    'bot', level, __file__, 1, 'msg', None, None
+                ))
+                for _ in range(1000)
+            )
+
+        assert 50 < passed(logging.DEBUG) < 150
+        assert passed(logging.ERROR) == 1000
+
+
+class TestQueueLogging:
+
+    def test_records_reach_rotating_file(self, tmp_path):
+        path = tmp_path / 'program.log'
+        target = logsetup.file_handler(str(path), max_bytes=200,
+                                       backup_count=2, when='')
+        handler = logsetup.start_queue_logging([target], sample='DEBUG=0')
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        logger = logging.getLogger('test_logsetup')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        try:
+            logger.debug('отброшено')
+            for index in range(20):
+                logger.info('запись %s', index)
+        finally:
+            logger.removeHandler(handler)
+            logsetup.stop_queue_logging(handler)
+            target.close()
+        text = path.read_text(encoding='utf-8')
+        assert 'отброшено' not in text
+        assert 'INFO запись 19' in text
+        assert (tmp_path / 'program.log.1').exists(), (
+            'Файл лога должен ротироваться по размеру.'
+        )
+
+    def test_stop_is_idempotent(self):
+        handler = logsetup.start_queue_logging([logging.NullHandler()])
+        logsetup.stop_queue_logging(handler)
+        assert not handler.listening
+        logsetup.stop_queue_logging(handler)
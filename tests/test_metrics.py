@@ -0,0 +1,86 @@
+import socket
+import urllib.request
+
+import pytest
+import requests
+
+import metrics
+from exeptions import GetAPIError, ResponseSchemaError
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestMetrics:
+
+    def test_histogram_render(self):
+        histogram = metrics.Histogram(
+            'test_seconds', 'Test.', ('stage',), buckets=(0.1, 1)
+        )
+        histogram.observe(0.05, stage='fetch')
+        histogram.observe(0.5, stage='fetch')
+        text = histogram.render()
+        assert '# TYPE test_seconds histogram' in text
+        assert 'test_seconds_bucket{stage="fetch",le="0.1"} 1' in text
+        assert 'test_seconds_bucket{stage="fetch",le="1"} 2' in text
+        assert 'test_seconds_bucket{stage="fetch",le="+Inf"} 2' in text
+        assert 'test_seconds_count{stage="fetch"} 2' in text
+
+    def test_timed_counts_errors_by_type(self):
+        @metrics.timed('test_stage')
+        def failing(error):
+            raise error
+
+        before = metrics.STAGE_SECONDS.count(stage='test_stage')
+        for error in (GetAPIError('x'), KeyError('x')):
+            with pytest.raises(type(error)):
+                failing(error)
+        assert metrics.STAGE_SECONDS.count(stage='test_stage') == before + 2
+        assert metrics.ERRORS.value(
+            stage='test_stage', type='GetAPIError'
+        ) >= 1
+        assert metrics.ERRORS.value(
+            stage='test_stage', type='unexpected'
+        ) >= 1
+
+    @pytest.mark.parametrize('error, expected', [
+        (requests.ConnectionError('x'), 'ConnectionError'),
+        (requests.ConnectTimeout('x'), 'TimeoutError'),
+        (requests.ReadTimeout('x'), 'TimeoutError'),
+        (ConnectionError('x'), 'ConnectionError'),
+        (TimeoutError('x'), 'TimeoutError'),
+        (ResponseSchemaError('x'), 'ResponseSchemaError'),
+        (KeyError('x'), 'unexpected'),
+    ])
+    def test_error_type(self, error, expected):
+        assert metrics.error_type(error) == expected
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter('test_total', 'Test.', ('value',))
+        counter.inc(value='a\\b "c"\nd')
+        expected = r'test_total{value="a\\b \"c\"\nd"} 1'
+        assert expected in counter.render()
+
+    def test_homework_stages_are_instrumented(self, homework_module):
+        before = metrics.STAGE_SECONDS.count(stage='parse_status')
+        homework_module.parse_status(
+            {'homework_name': 'hw', 'status': 'approved'}
+        )
+        assert metrics.STAGE_SECONDS.count(stage='parse_status') == before + 1
+
+    def test_http_endpoint(self):
+        metrics.QUEUE_DEPTH.set_function(lambda: 7, queue='test')
+        port = free_port()
+        server = metrics.start_http_server(port)
+        try:
+            url = f'http://127.0.0.1:{port}/metrics'
+            with urllib.request.urlopen(url) as response:
+                body = response.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert 'homework_bot_queue_depth{queue="test"} 7' in body
+        assert '# TYPE homework_bot_stage_seconds histogram' in body
@@ -0,0 +1,62 @@
+import requests
+import telegram
+
+import storage
+import utils
+
+
+class TestRunOnce:
+
+    def setup_tokens(self, homework_module):
+        homework_module.PRACTICUM_TOKEN = 'sometoken'
+        homework_module.TELEGRAM_TOKEN = '1234:abcdefg'
+        homework_module.TELEGRAM_CHAT_ID = '12345'
+
+    def test_state_is_kept_between_runs(self, monkeypatch, tmp_path,
+                                        homework_module):
+        self.setup_tokens(homework_module)
+        path = str(tmp_path / 'state.sqlite3')
+        requested = []
+        sent = []
+
+        def mock_get(*args, params=None, **kwargs):
+            requested.append(dict(params))
+            response = utils.MockResponseGET(random_timestamp=1000198991)
+            response.json = lambda: {
+                'homeworks': [
+                    {'homework_name': 'hw123', 'status': 'approved'}
+                ],
+                'current_date': 1000198991 + len(requested),
+            }
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(
+            homework_module, 'send_message',
+            lambda bot, text: sent.append(text)
+        )
+        assert homework_module.run_once(path) == 0
+        assert homework_module.run_once(path) == 0
+        assert len(sent) == 1, 'Статус отправляется только один раз.'
+        assert requested[1] == {'from_date': 1000198992}
+        state = storage.StateStore(path)
+        assert state.load_cursor('12345', 0) == 1000198993
+        assert storage.Outbox(path).pending() == 0
+
+    def test_failure_returns_nonzero(self, monkeypatch, tmp_path,
+                                     homework_module):
+        self.setup_tokens(homework_module)
+
+        def failing_get(*args, **kwargs):
+            raise requests.RequestException('Something wrong')
+
+        monkeypatch.setattr(requests, 'get', failing_get)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        path = str(tmp_path / 'state.sqlite3')
+        assert homework_module.run_once(path) == 1
+
+    def test_parse_args(self, homework_module):
+        args = homework_module.parse_args(['--once', '--state', 'x.db'])
+        assert args.once and args.state == 'x.db'
+        assert not homework_module.parse_args([]).once
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import pstats
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import metrics
+import profiling
+
+
+class TestProfiler:
+
+    def run_cycles(self, profiler, count):
+        for _ in range(count):
+            with profiler.cycle():
+                with metrics.stage('test_profile'):
+                    sum(range(1000))
+
+    def test_disabled_by_default(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path))
+        self.run_cycles(profiler, 3)
+        assert not profiler.active
+        assert os.listdir(tmp_path) == []
+
+    def test_capture_for_requested_cycles(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path))
+        profiler.request(2)
+        self.run_cycles(profiler, 3)
+        assert not profiler.active
+        assert profiler._observe not in metrics.STAGE_OBSERVERS
+        names = sorted(os.listdir(tmp_path))
+        assert len(names) == 3, names
+        base = os.path.join(tmp_path, names[0].split('.')[0])
+        with open(base + '.json', encoding='utf-8') as file:
+            report = json.load(file)
+        assert report['cycles'] == 2
+        assert report['stages']['test_profile']['count'] == 2
+        assert pstats.Stats(base + '.pstats').total_calls > 0
+        assert os.path.getsize(base + '.tracemalloc.txt') > 0
+
+    def test_tools_can_be_disabled(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path), tools='')
+        profiler.request(1)
+        self.run_cycles(profiler, 1)
+        assert [name.split('.', 1)[1] for name in os.listdir(tmp_path)] == [
+            'json'
+        ]
+        with pytest.raises(ValueError):
+            profiling.Profiler(str(tmp_path), tools='perf')
+
+    @pytest.mark.skipif(not hasattr(signal, 'SIGUSR2'), reason='нет SIGUSR2')
+    def test_signal_requests_capture(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path))
+        previous = signal.getsignal(signal.SIGUSR2)
+        try:
+            profiler.install_signal()
+            os.kill(os.getpid(), signal.SIGUSR2)
+        finally:
+            signal.signal(signal.SIGUSR2, previous)
+        self.run_cycles(profiler, 1)
+        assert profiler.active, 'После сигнала начинается съём профиля.'
+        self.run_cycles(profiler, profiling.PROFILE_SIGNAL_CYCLES - 1)
+        assert not profiler.active
+        assert len(os.listdir(tmp_path)) == 3
+
+    def test_concurrent_cycles_stop_capture(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path), tools='')
+
+        async def cycle():
+            with profiler.cycle():
+                await asyncio.sleep(0.01)
+
+        async def run_concurrently(count):
+            await asyncio.gather(*(cycle() for _ in range(count)))
+
+        profiler.request(2)
+        asyncio.run(run_concurrently(5))
+        assert not profiler.active
+        assert profiler._remaining == 0
+        assert profiler.report()['cycles'] == 2
+        profiler.request(3)
+        asyncio.run(run_concurrently(5))
+        assert not profiler.active, 'Новый запрос снова снимает профиль.'
+        assert profiler.report()['cycles'] == 3
+        assert len(os.listdir(tmp_path)) == 2
+
+    def test_executor_threads_are_profiled(self, tmp_path):
+        profiler = profiling.Profiler(str(tmp_path), tools='cprofile')
+
+        def work_in_thread():
+            return sum(range(1000))
+
+        profiler.request(1)
+        with profiler.cycle():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(profiler.call, work_in_thread).result()
+        name, = [
+            name for name in os.listdir(tmp_path) if name.endswith('.pstats')
+        ]
+        stats = pstats.Stats(os.path.join(tmp_path, name)).stats
+        assert any(
+            function == 'work_in_thread' for _, _, function in stats
+        ), 'Вызовы в пуле потоков попадают в профиль.'
@@ -0,0 +1,101 @@
+import pytest
+import telegram
+
+import utils
+from exeptions import DeadlineExceededError
+from fanout import fan_out
+from ratelimit import (RateLimitedBot, RateLimiter, TokenBucket,
+                       send_deadline)
+from scheduler import Deadline
+
+
+class TestRateLimiter:
+
+    def test_bucket_refills_at_rate(self):
+        clock = utils.FakeClock()
+        bucket = TokenBucket(2, capacity=2, clock=clock)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.5)
+        clock.now += 1.5
+        assert bucket.reserve() == 0
+
+    def test_per_chat_and_global_limits(self):
+        clock = utils.FakeClock()
+        limiter = RateLimiter(
+            global_rate=30, chat_rate=1, sleep=clock.sleep, clock=clock
+        )
+        for chat_id in range(30):
+            limiter.wait(chat_id)
+        assert clock.sleeps == [], 'Разные чаты не ждут друг друга.'
+        limiter.wait(0)
+        assert clock.sleeps == [pytest.approx(1)]
+
+    def test_retry_after_pauses_and_retries(self):
+        clock = utils.FakeClock()
+        limiter = RateLimiter(sleep=clock.sleep, clock=clock)
+        calls = []
+
+        class FloodedBot:
+            def send_message(self, chat_id, text, **kwargs):
+                calls.append(text)
+                if len(calls) == 1:
+                    raise telegram.error.RetryAfter(5)
+                return 'ok'
+
+        bot = RateLimitedBot(FloodedBot(), limiter, retries=1)
+        assert bot.send_message('1', 'text') == 'ok'
+        assert len(calls) == 2
+        assert clock.sleeps == [pytest.approx(5)]
+
+    def test_retry_after_raises_after_retries(self):
+        limiter = RateLimiter(sleep=lambda seconds: None)
+
+        class AlwaysFlooded:
+            def send_message(self, chat_id, text, **kwargs):
+                raise telegram.error.RetryAfter(1)
+
+        bot = RateLimitedBot(AlwaysFlooded(), limiter, retries=2)
+        with pytest.raises(telegram.error.RetryAfter):
+            bot.send_message('1', 'text')
+
+    def test_wait_beyond_deadline_raises_and_refunds(self):
+        clock = utils.FakeClock()
+        limiter = RateLimiter(
+            global_rate=30, chat_rate=1, sleep=clock.sleep, clock=clock
+        )
+        limiter.wait('1')
+        with pytest.raises(DeadlineExceededError):
+            limiter.wait('1', Deadline(0.5, clock=clock))
+        assert clock.sleeps == []
+        limiter.wait('1', Deadline(2, clock=clock))
+        assert clock.sleeps == [pytest.approx(1)], (
+            'Неиспользованный токен возвращён в корзину.'
+        )
+
+    def test_retry_after_beyond_deadline_is_not_slept(self):
+        clock = utils.FakeClock()
+        limiter = RateLimiter(sleep=clock.sleep, clock=clock)
+
+        class FloodedBot:
+            def send_message(self, chat_id, text, **kwargs):
+                raise telegram.error.RetryAfter(30)
+
+        bot = RateLimitedBot(FloodedBot(), limiter)
+        with send_deadline(Deadline(10, clock=clock)):
+            with pytest.raises(DeadlineExceededError):
+                bot.send_message('1', 'text')
+        assert clock.sleeps == []
+        with pytest.raises(DeadlineExceededError):
+            limiter.wait('2', Deadline(10, clock=clock))
+
+    def test_deadline_reaches_fan_out_threads(self):
+        limiter = RateLimiter(sleep=lambda seconds: None)
+        limiter.pause(60)
+        bot = RateLimitedBot(object(), limiter)
+        with send_deadline(Deadline(1)):
+            results = fan_out(bot.send_message, ['1', '2'], 'text')
+        assert all(
+            isinstance(error, DeadlineExceededError)
+            for error in results.values()
+        )
@@ -0,0 +1,52 @@
+import random
+
+from exeptions import TooManyRequestsError
+from scheduler import Deadline, PollScheduler
+
+
+class TestPollScheduler:
+
+    def make_scheduler(self):
+        return PollScheduler(
+            600, review_period=120, min_period=60, max_period=3600,
+            rng=random.Random(0)
+        )
+
+    def test_success_period_depends_on_statuses(self):
+        scheduler = self.make_scheduler()
+        assert scheduler.success({}) == 600
+        assert scheduler.success({'hw1': 'reviewing'}) == 120
+        assert scheduler.success({'hw1': 'approved'}) == 600
+
+    def test_failure_backs_off_within_bounds(self):
+        scheduler = self.make_scheduler()
+        delays = [scheduler.failure() for _ in range(10)]
+        for attempt, delay in enumerate(delays):
+            ceiling = min(3600, 600 * 2 ** (attempt + 1))
+            assert ceiling / 2 <= delay <= ceiling
+        assert delays[-1] >= 1800
+        scheduler.success({})
+        assert 600 <= scheduler.failure() <= 1200
+
+    def test_first_failure_is_not_faster_than_period(self):
+        for seed in range(20):
+            scheduler = PollScheduler(600, rng=random.Random(seed))
+            assert scheduler.failure() >= scheduler.period
+
+    def test_retry_after_is_honored(self):
+        scheduler = self.make_scheduler()
+        assert scheduler.failure(
+            TooManyRequestsError(retry_after=3000)
+        ) == 3000
+
+
+class TestDeadline:
+
+    def test_remaining_and_expired(self):
+        now = [100.0]
+        deadline = Deadline(10, clock=lambda: now[0])
+        assert deadline.remaining() == 10
+        assert not deadline.expired
+        now[0] = 115.0
+        assert deadline.remaining() == 0
+        assert deadline.expired
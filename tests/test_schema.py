@@ -0,0 +1,56 @@
+import pytest
+
+from exeptions import ResponseSchemaError
+from schema import Defect, Field, compile_schema
+
+
+class TestSchema:
+    VALIDATOR = compile_schema({
+        'homework_name': Field(str),
+        'status': Field(str, choices=('approved', 'rejected')),
+        'id': Field(int, required=False),
+    })
+
+    def test_valid_record_has_no_defects(self):
+        assert self.VALIDATOR(
+            {'homework_name': 'hw', 'status': 'approved'}
+        ) == []
+        assert self.VALIDATOR(
+            {'homework_name': 'hw', 'status': 'rejected', 'id': 1}
+        ) == []
+
+    def test_all_defects_reported_at_once(self):
+        defects = self.VALIDATOR({'status': 'unknown', 'id': 'x'}, 3)
+        assert defects == [
+            Defect(3, 'homework_name', 'нет ключа'),
+            Defect(3, 'status', "недопустимое значение 'unknown'"),
+            Defect(3, 'id', 'ожидался int, получен str'),
+        ]
+        assert self.VALIDATOR(['not', 'a', 'dict'])[0].field is None
+
+    def test_validate_many_splits_valid_and_defective(self):
+        records = [
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw2'},
+            {'status': 'rejected'},
+            {'homework_name': 'hw4', 'status': 'rejected'},
+        ]
+        valid, defects = self.VALIDATOR.validate_many(records)
+        assert valid == [records[0], records[3]]
+        assert [(d.index, d.field) for d in defects] == [
+            (1, 'status'), (2, 'homework_name')
+        ]
+
+    def test_main_reports_defects_after_valid_homeworks(self,
+                                                        homework_module):
+        valid, defects = homework_module.check_homeworks([
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw2', 'status': 'unknown'},
+            {'status': 'approved'},
+        ])
+        assert len(valid) == 1
+        with pytest.raises(ResponseSchemaError) as error:
+            homework_module.raise_for_defects(defects)
+        assert len(error.value.defects) == 2
+        assert 'работа №1' in str(error.value)
+        assert 'работа №2' in str(error.value)
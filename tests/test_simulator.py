@@ -0,0 +1,68 @@
+import pytest
+import requests
+
+from benchmarks.simulator import Simulator, World, token_name
+
+
+@pytest.fixture
+def simulator():
+    world = World(3, homeworks=4, transition=10, start=1000)
+    with Simulator(world) as simulator:
+        yield simulator
+
+
+class TestWorld:
+
+    def test_statuses_change_over_time(self):
+        world = World(1, homeworks=5, transition=10, start=1000)
+        token = token_name(0)
+        assert world.answer(token, 0, now=999)['homeworks'] == []
+        late = world.answer(token, 0, now=10 ** 6)
+        assert len(late['homeworks']) == 5
+        assert {work['status'] for work in late['homeworks']} == {'approved'}
+        assert late['current_date'] == 10 ** 6
+        assert world.answer(token, 10 ** 6, now=10 ** 6)['homeworks'] == []
+
+    def test_history_is_reproducible(self):
+        first = World(2, transition=10, start=0, seed=1)
+        second = World(2, transition=10, start=0, seed=1)
+        assert (first.answer(token_name(1), 0, now=50)
+                == second.answer(token_name(1), 0, now=50))
+        assert not first.knows('token-2') and first.knows('token-1')
+
+
+class TestSimulator:
+
+    def test_answer_passes_bot_checks(self, simulator, homework_module,
+                                      monkeypatch):
+        monkeypatch.setattr(homework_module, 'ENDPOINT', simulator.url)
+        headers = {'Authorization': f'OAuth {token_name(2)}'}
+        response = homework_module.fetch_homeworks(headers, {'from_date': 0})
+        homework_module.check_response(response)
+        for work in response['homeworks']:
+            homework_module.parse_status(work)
+        assert simulator.responses[200] == 1
+
+    def test_errors(self, simulator):
+        good = {'Authorization': f'OAuth {token_name(0)}'}
+        bad = {'Authorization': 'OAuth unknown'}
+        assert requests.get(
+            simulator.url, headers=bad, params={'from_date': 0}
+        ).status_code == 401
+        assert requests.get(
+            simulator.url, headers=good, params={'from_date': 'x'}
+        ).status_code == 400
+        simulator.outage(60)
+        assert requests.get(
+            simulator.url, headers=good, params={'from_date': 0}
+        ).status_code == 500
+        simulator.outage_until = 0.5
+        simulator.error_rate = 1
+        assert requests.get(
+            simulator.url, headers=good, params={'from_date': 0}
+        ).status_code == 500
+        simulator.error_rate = 0
+        assert requests.get(
+            simulator.url, headers=good, params={'from_date': 0}
+        ).status_code == 200
+        assert token_name(0) in simulator.recovered
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+import engine
+import metrics
+import utils
+from singleflight import SingleFlight
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_result(self):
+        calls = []
+
+        async def fetch(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return [value]
+
+        async def run():
+            flights = SingleFlight()
+            results = await asyncio.gather(
+                *(flights.do('key', fetch, 1) for _ in range(5)),
+                flights.do('other', fetch, 2),
+            )
+            assert len(flights) == 0
+            await flights.do('key', fetch, 3)
+            return results
+
+        coalesced = metrics.COALESCED_REQUESTS.value()
+        results = asyncio.run(run())
+        assert calls == [1, 2, 3]
+        assert results[:5] == [[1]] * 5 and results[5] == [2]
+        assert metrics.COALESCED_REQUESTS.value() == coalesced + 4
+
+    def test_error_is_shared(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        async def run():
+            flights = SingleFlight()
+            return await asyncio.gather(
+                flights.do('key', fail), flights.do('key', fail),
+                return_exceptions=True,
+            )
+
+        first, second = asyncio.run(run())
+        assert isinstance(first, ValueError) and second is first
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        async def run():
+            flights = SingleFlight()
+            leader = asyncio.ensure_future(flights.do('key', fetch))
+            follower = asyncio.ensure_future(flights.do('key', fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(run()) == 'done'
+
+
+class TestEngineCoalescing:
+
+    def test_shared_token_is_requested_once(self, monkeypatch):
+        lock = threading.Lock()
+        requested = []
+
+        def slow_get(*args, **kwargs):
+            with lock:
+                requested.append(kwargs['headers']['Authorization'])
+            time.sleep(0.02)
+            response = utils.MockResponseGET(random_timestamp=1)
+            response.json = lambda: {
+                'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+                'current_date': 2,
+            }
+            return response
+
+        monkeypatch.setattr(requests, 'get', slow_get)
+        bot = utils.RecordingBot()
+        tenants = [
+            engine.Tenant(name='student', token='shared', chat_id='1'),
+            engine.Tenant(name='mentor', token='shared', chat_id='2'),
+            engine.Tenant(name='other', token='own', chat_id='3'),
+        ]
+        polling = engine.PollingEngine(bot, tenants, session=requests)
+
+        async def poll_all():
+            await asyncio.gather(*(polling.poll(t) for t in tenants))
+            await polling.outgoing.join()
+
+        asyncio.run(poll_all())
+        assert sorted(requested) == ['OAuth own', 'OAuth shared'], (
+            'Одновременные запросы с общим токеном должны объединяться.'
+        )
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '2', '3']
+        assert all(tenant.from_date == 2 for tenant in tenants)
+
+    def test_shared_token_stays_coalesced_across_cycles(self, monkeypatch):
+        lock = threading.Lock()
+        from_dates = []
+
+        def slow_get(*args, params=None, **kwargs):
+            with lock:
+                from_dates.append(params['from_date'])
+                cycle = len(from_dates)
+            time.sleep(0.02)
+            response = utils.MockResponseGET()
+            response.json = lambda: {
+                'homeworks': [
+                    {'homework_name': 'new', 'status': 'approved',
+                     'date_updated': '2020-02-13T14:40:57Z'},
+                    {'homework_name': 'old', 'status': 'approved',
+                     'date_updated': '2000-01-01T00:00:00Z'},
+                ],
+                'current_date': 1600000000 + cycle,
+            }
+            return response
+
+        monkeypatch.setattr(requests, 'get', slow_get)
+        bot = utils.RecordingBot()
+        tenants = [
+            engine.Tenant(
+                name='student', token='shared', chat_id='1', from_date=0
+            ),
+            engine.Tenant(
+                name='mentor', token='shared', chat_id='2',
+                from_date=1000000000,
+            ),
+        ]
+        polling = engine.PollingEngine(bot, tenants, session=requests)
+
+        async def poll_cycles():
+            for _ in range(3):
+                await asyncio.gather(*(polling.poll(t) for t in tenants))
+            await polling.outgoing.join()
+
+        asyncio.run(poll_cycles())
+        assert from_dates == [0, 1600000001, 1600000002], (
+            'Пользователи с общим токеном опрашиваются одним запросом '
+            'с самым ранним курсором в каждом цикле.'
+        )
+        assert sorted(chat for chat, _ in bot.sent) == ['1', '1', '2'], (
+            'Работа старше курсора наставника ему не отправляется.'
+        )
+        assert all(tenant.from_date == 1600000003 for tenant in tenants)
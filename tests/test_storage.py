@@ -0,0 +1,183 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+import telegram
+
+import ratelimit
+import storage
+import utils
+from scheduler import Deadline
+
+
+class TestStateStore:
+
+    def test_default_path_is_a_file(self):
+        env = {k: v for k, v in os.environ.items() if k != 'STATE_DB'}
+        code = (
+            'import homework, storage; '
+            'print(storage.STATE_DB, homework.STATE_DB)'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], env=env, capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.split()
+        assert output == ['homework.sqlite3', 'homework.sqlite3']
+
+    def test_state_survives_reopen(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        state = storage.StateStore(path)
+        state.save('chat', 1000, {'hw1': 'reviewing'})
+        state.save('chat', 2000, {'hw1': 'approved', 'hw2': 'reviewing'})
+        state.close()
+
+        state = storage.StateStore(path)
+        assert state.load_cursor('chat', 0) == 2000
+        assert state.load_statuses('chat') == {
+            'hw1': 'approved', 'hw2': 'reviewing'
+        }
+        assert state.load_cursor('other', 42) == 42
+        assert state.load_statuses('other') == {}
+        state.close()
+
+    def test_main_resumes_from_saved_cursor(self, monkeypatch, tmp_path,
+                                            homework_module):
+        path = str(tmp_path / 'state.sqlite3')
+        state = storage.StateStore(path)
+        state.save('12345', 1000198000, {'hw123': 'approved'})
+        state.close()
+        monkeypatch.setattr(
+            homework_module, 'StateStore', lambda: storage.StateStore(path)
+        )
+        homework_module.PRACTICUM_TOKEN = 'sometoken'
+        homework_module.TELEGRAM_TOKEN = '1234:abcdefg'
+        homework_module.TELEGRAM_CHAT_ID = '12345'
+        requested = []
+        sent = []
+
+        def mock_get(*args, params=None, **kwargs):
+            requested.append(dict(params))
+            response = utils.MockResponseGET(random_timestamp=1000198991)
+            response.json = lambda: {
+                'homeworks': [
+                    {'homework_name': 'hw123', 'status': 'approved'}
+                ],
+                'current_date': 1000198991,
+            }
+            return response
+
+        def break_loop(secs):
+            raise utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        monkeypatch.setattr(time, 'sleep', break_loop)
+        monkeypatch.setattr(
+            homework_module, 'send_message',
+            lambda bot, text: sent.append(text)
+        )
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        try:
+            homework_module.main()
+        except utils.BreakInfiniteLoop:
+            pass
+        assert requested == [{'from_date': 1000198000}]
+        assert sent == [], 'Уже отправленный статус не отправляется повторно.'
+        state = storage.StateStore(path)
+        assert state.load_cursor('12345', 0) == 1000198991
+
+
+class TestOutbox:
+
+    def test_add_is_idempotent(self):
+        outbox = storage.Outbox()
+        assert outbox.add('chat:hw1:approved', 'chat', '1', 'text')
+        assert not outbox.add('chat:hw1:approved', 'chat', '1', 'text')
+        assert outbox.due() == [('chat:hw1:approved', '1', 'text')]
+        assert outbox.due() == [], 'Выбранное сообщение не выдаётся повторно.'
+        outbox.done('chat:hw1:approved')
+        assert not outbox.add('chat:hw1:approved', 'chat', '1', 'text')
+        assert outbox.pending() == 0
+
+    def test_purge_removes_old_delivered(self, monkeypatch):
+        outbox = storage.Outbox()
+        for key in ('old', 'recent', 'pending'):
+            outbox.add(key, 'chat', '1', 'text')
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now - 100)
+        outbox.done('old')
+        monkeypatch.undo()
+        outbox.done('recent')
+        assert outbox.purge(keep=50) == 1
+        assert not outbox.add('recent', 'chat', '1', 'text')
+        assert outbox.add('old', 'chat', '1', 'text')
+        plan = outbox._connection.execute(
+            'EXPLAIN QUERY PLAN DELETE FROM outbox WHERE delivered_at < ?',
+            (now,)
+        ).fetchall()
+        assert 'outbox_delivered' in plan[0][-1]
+
+    def test_retry_later_backs_off(self, monkeypatch):
+        outbox = storage.Outbox(base_delay=10, max_delay=25)
+        outbox.add('key', 'chat', '1', 'text')
+        now = time.time()
+        for expected in (10, 20, 25):
+            outbox.retry_later('key')
+            monkeypatch.setattr(time, 'time', lambda: now + expected - 1)
+            assert outbox.due() == []
+            monkeypatch.setattr(time, 'time', lambda: now + expected + 1)
+            assert [row[0] for row in outbox.due()] == ['key']
+            monkeypatch.undo()
+
+    def test_expired_deadline_leaves_messages_queued(self, homework_module):
+        outbox = storage.Outbox()
+        outbox.add('key', 'chat', '1', 'text')
+        bot = utils.MockTelegramBot()
+        homework_module.deliver_pending(bot, outbox, Deadline(0))
+        assert outbox.pending() == 1
+        assert outbox.due() == [('key', '1', 'text')], (
+            'Неотправленное по бюджету сообщение сразу доступно снова.'
+        )
+
+    def test_retry_after_beyond_deadline_leaves_message_queued(
+            self, homework_module):
+        sleeps = []
+        limiter = ratelimit.RateLimiter(sleep=sleeps.append)
+
+        class FloodedBot:
+            def send_message(self, chat_id, text, **kwargs):
+                raise telegram.error.RetryAfter(60)
+
+        bot = ratelimit.RateLimitedBot(FloodedBot(), limiter)
+        outbox = storage.Outbox()
+        outbox.add('key', 'chat', '1', 'text')
+        homework_module.deliver_pending(bot, outbox, Deadline(5))
+        assert sleeps == [], 'Пауза дольше бюджета не выжидается.'
+        assert outbox.due() == [('key', '1', 'text')]
+
+    def test_pending_survives_reopen(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        outbox = storage.Outbox(path)
+        outbox.add('key', 'chat', '1', 'text')
+        outbox.close()
+        assert storage.Outbox(path).pending() == 1
+        assert storage.Outbox(path).durable
+        assert not storage.Outbox(':memory:').durable
+
+    def test_main_warns_about_volatile_outbox(self, monkeypatch, caplog,
+                                              homework_module):
+        class BreakInfiniteLoop(Exception):
+            pass
+
+        def stop_sleep(delay):
+            raise BreakInfiniteLoop
+
+        monkeypatch.setattr(requests, 'get', utils.MockResponseGET)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(homework_module.time, 'sleep', stop_sleep)
+        with caplog.at_level('WARNING'), pytest.raises(BreakInfiniteLoop):
+            homework_module.main()
+        assert storage.VOLATILE_OUTBOX in caplog.text
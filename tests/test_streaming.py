@@ -0,0 +1,94 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+import engine
+import utils
+from streaming import StreamedAnswer
+
+
+def chunked(data, size):
+    raw = json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8')
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class StreamingResponse:
+    status_code = HTTPStatus.OK
+
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return iter(chunked(self.data, 5))
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingSession:
+    def __init__(self, data):
+        self.response = StreamingResponse(data)
+
+    def get(self, url, stream=False, **kwargs):
+        assert stream, 'В потоковом режиме тело не загружается целиком.'
+        return self.response
+
+
+class TestStreamedAnswer:
+    DATA = {
+        'current_date': 1581604970,
+        'homeworks': [
+            {
+                'id': index,
+                'homework_name': f'Работа «{index}»',
+                'status': 'approved',
+                'reviewer_comment': 'Всё нравится 👍',
+            }
+            for index in range(20)
+        ],
+        'extra': {'nested': [1, 2.5, None, True]},
+    }
+
+    @pytest.mark.parametrize('size', [1, 3, 7, 4096])
+    def test_matches_json_loads(self, size):
+        answer = StreamedAnswer(chunked(self.DATA, size))
+        assert list(answer) == self.DATA['homeworks']
+        assert answer.current_date == self.DATA['current_date']
+        assert answer.meta['extra'] == self.DATA['extra']
+
+    @pytest.mark.parametrize('data', [
+        [{'homeworks': []}],
+        {'current_date': 1},
+        {'homeworks': {'homework_name': 'hw', 'status': 'approved'}},
+    ])
+    def test_invalid_structure_raises_type_error(self, data):
+        with pytest.raises(TypeError):
+            list(StreamedAnswer(chunked(data, 4)))
+
+    def test_truncated_body_raises(self):
+        chunks = chunked(self.DATA, 16)[:-3]
+        with pytest.raises(ValueError):
+            list(StreamedAnswer(chunks))
+
+    def test_engine_streaming_mode(self):
+        session = StreamingSession({
+            'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+            'current_date': 42,
+        })
+        tenant = engine.Tenant(name='t', token='token', chat_id='1')
+        bot = utils.RecordingBot()
+        polling = engine.PollingEngine(
+            bot, [tenant], session=session, streaming=True
+        )
+
+        async def poll_once():
+            await polling.poll(tenant)
+            await polling.outgoing.join()
+
+        asyncio.run(poll_once())
+        assert tenant.from_date == 42
+        assert len(bot.sent) == 1
+        assert session.response.closed
@@ -0,0 +1,221 @@
+import multiprocessing
+import os
+import signal
+import time
+from collections import Counter
+
+import pytest
+import telegram
+
+import engine
+import homework
+import supervisor
+import utils
+from benchmarks.simulator import Simulator, World, token_name
+from ratelimit import TELEGRAM_GLOBAL_RATE
+
+
+def make_tenants(count, tokens=None):
+    return [
+        engine.Tenant(
+            name=f't{i}', token=f'token-{i % (tokens or count)}',
+            chat_id=str(i),
+        )
+        for i in range(count)
+    ]
+
+
+def fake_worker(shard, records, heartbeats, share, state_db):
+    stopped = []
+    signal.signal(signal.SIGTERM, lambda *args: stopped.append(True))
+    while not stopped:
+        heartbeats.put((shard, os.getpid(), {
+            'records': len(records), 'share': share.value
+        }))
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def state_db(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestHashRing:
+
+    def test_keys_are_spread_over_nodes(self):
+        ring = supervisor.HashRing(['a', 'b', 'c', 'd'])
+        owners = Counter(ring.node_for(f'token-{i}') for i in range(4000))
+        assert set(owners) == {'a', 'b', 'c', 'd'}
+        assert max(owners.values()) < 1.4 * min(owners.values())
+
+    def test_adding_node_moves_only_its_share(self):
+        ring = supervisor.HashRing(['a', 'b', 'c'])
+        keys = [f'token-{i}' for i in range(3000)]
+        before = {key: ring.node_for(key) for key in keys}
+        ring.add('d')
+        moved = [key for key in keys if ring.node_for(key) != before[key]]
+        assert all(ring.node_for(key) == 'd' for key in moved)
+        assert 0.15 < len(moved) / len(keys) < 0.35
+
+    def test_removing_node_moves_only_its_keys(self):
+        ring = supervisor.HashRing(['a', 'b', 'c'])
+        keys = [f'token-{i}' for i in range(3000)]
+        before = {key: ring.node_for(key) for key in keys}
+        ring.remove('b')
+        for key in keys:
+            if before[key] != 'b':
+                assert ring.node_for(key) == before[key]
+
+    def test_shared_token_stays_in_one_shard(self):
+        ring = supervisor.HashRing(['a', 'b', 'c'])
+        shards = ring.assign(make_tenants(30, tokens=5))
+        for tenants in shards.values():
+            for token in {tenant.token for tenant in tenants}:
+                assert all(
+                    tenant.token != token
+                    for other in shards.values() if other is not tenants
+                    for tenant in other
+                )
+
+    def test_empty_ring(self):
+        with pytest.raises(LookupError):
+            supervisor.HashRing().node_for('token')
+
+
+class TestSupervisor:
+
+    def make_supervisor(self, workers, state_db, **kwargs):
+        return supervisor.Supervisor(
+            make_tenants(40), workers, target=fake_worker,
+            start_method='fork', shutdown_timeout=2, state_db=state_db,
+            **kwargs,
+        )
+
+    def owners(self, shards):
+        return {
+            tenant.name: name
+            for name, shard in shards.shards.items()
+            for tenant in shard.tenants
+        }
+
+    def healthy(self, shards):
+        def condition():
+            shards.check()
+            health = shards.health()
+            return all(shard['healthy'] for shard in health.values())
+        return condition
+
+    def test_health_and_resize(self, state_db):
+        shards = self.make_supervisor(2, state_db).start()
+        try:
+            assert wait_until(self.healthy(shards))
+            health = shards.health()
+            assert sorted(health) == ['shard-0', 'shard-1']
+            assert sum(shard['tenants'] for shard in health.values()) == 40
+            assert all(
+                shard['records'] == shard['tenants']
+                for shard in health.values()
+            )
+            before = self.owners(shards)
+
+            shards.resize(3)
+            assert wait_until(self.healthy(shards))
+            health = shards.health()
+            assert sorted(health) == ['shard-0', 'shard-1', 'shard-2']
+            assert sum(shard['tenants'] for shard in health.values()) == 40
+            after = self.owners(shards)
+            moved = [name for name in before if before[name] != after[name]]
+            assert all(after[name] == 'shard-2' for name in moved)
+            assert len(moved) < 20
+            assert wait_until(lambda: shards.check() or all(
+                shard['share'] == pytest.approx(TELEGRAM_GLOBAL_RATE / 3)
+                for shard in shards.health().values()
+            )), 'Не перезапущенные шарды тоже получают новую долю лимита.'
+
+            shards.resize(2)
+            assert wait_until(self.healthy(shards))
+            assert sorted(shards.health()) == ['shard-0', 'shard-1']
+            assert self.owners(shards) == before
+        finally:
+            shards.stop()
+        assert not any(shard.alive for shard in shards.shards.values())
+
+    def test_dead_worker_is_restarted(self, state_db):
+        shards = self.make_supervisor(2, state_db).start()
+        try:
+            assert wait_until(self.healthy(shards))
+            victim = shards.shards['shard-0']
+            pid = victim.process.pid
+            victim.process.kill()
+            victim.process.join()
+            shards.check()
+            assert victim.restarts == 1
+            assert victim.process.pid != pid
+            assert wait_until(self.healthy(shards))
+        finally:
+            shards.stop()
+
+    def test_silent_worker_is_restarted(self, state_db):
+        shards = self.make_supervisor(
+            1, state_db, heartbeat_timeout=0.5
+        ).start()
+        try:
+            assert wait_until(self.healthy(shards))
+            shard = shards.shards['shard-0']
+            os.kill(shard.process.pid, signal.SIGSTOP)
+            assert wait_until(lambda: shards.check() or shard.restarts)
+            assert wait_until(self.healthy(shards))
+        finally:
+            shards.stop()
+
+    def test_memory_state_db_is_refused(self):
+        with pytest.raises(ValueError):
+            supervisor.Supervisor(make_tenants(2), 1, state_db=':memory:')
+
+    def test_shared_limiter_follows_share(self):
+        share = multiprocessing.Value('d', 30.0)
+        limiter = supervisor.SharedRateLimiter(
+            share, sleep=lambda seconds: None
+        )
+        limiter.wait('1')
+        assert limiter.global_rate == 30
+        share.value = 10.0
+        limiter.wait('2')
+        assert limiter.global_rate == 10
+
+    def test_workers_poll_their_shards(self, monkeypatch, state_db):
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        with Simulator(World(40, transition=1e9)) as simulator:
+            monkeypatch.setattr(homework, 'ENDPOINT', simulator.url)
+            monkeypatch.setattr(supervisor, 'HEARTBEAT_INTERVAL', 0.1)
+            shards = supervisor.Supervisor(
+                [
+                    engine.Tenant(
+                        name=f't{i}', token=token_name(i), chat_id=str(i)
+                    )
+                    for i in range(40)
+                ],
+                2, start_method='fork', shutdown_timeout=5,
+                state_db=state_db,
+            )
+            shards.start()
+            try:
+                assert wait_until(lambda: shards.check() or all(
+                    shard.get('requests', 0) >= 1
+                    for shard in shards.health().values()
+                ))
+            finally:
+                shards.stop()
+        assert simulator.responses[200] >= 2
+        assert all(
+            shard.process.exitcode == 0 for shard in shards.shards.values()
+        )
@@ -0,0 +1,38 @@
+from http import HTTPStatus
+
+import transport
+import utils
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return utils.MockResponseGET(random_timestamp=1)
+
+
+class TestTransport:
+
+    def test_adapter_pool_and_retries(self):
+        with transport.Transport(pool_size=4, retries=3) as http:
+            adapter = http.session.get_adapter('https://practicum.yandex.ru')
+            assert adapter._pool_maxsize == 4
+            assert adapter.max_retries.total == 3
+            assert HTTPStatus.SERVICE_UNAVAILABLE in (
+                adapter.max_retries.status_forcelist
+            )
+
+    def test_shared_transport_is_single_instance(self):
+        assert transport.get_transport() is transport.get_transport()
+
+    def test_fetch_homeworks_uses_session(self, homework_module):
+        session = RecordingSession()
+        result = homework_module.fetch_homeworks(
+            homework_module.HEADERS, {'from_date': 0}, session
+        )
+        assert result['homeworks'] == []
+        url, kwargs = session.calls[0]
+        assert url == homework_module.ENDPOINT
+        assert kwargs['params'] == {'from_date': 0}
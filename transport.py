@@ -0,0 +1,65 @@
+"""Общая сессия requests с пулом соединений для запросов к API."""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class Transport:
+    """Сессия с keep-alive соединениями и повтором неудачных запросов.
+
+    Сессия переиспользует TCP и TLS соединения между запросами, поэтому
+    рукопожатие с сервером происходит один раз на соединение из пула.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF):
+        """Сессия с пулом на pool_size соединений."""
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, **kwargs):
+        """GET-запрос через пул соединений."""
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        """Закрытие всех соединений пула."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_transport():
+    """Общий для всех опросов экземпляр Transport."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Transport()
+        return _shared